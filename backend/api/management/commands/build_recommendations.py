@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации рецептов по избранному и корзинам'
+
+    def handle(self, *args, **options):
+        written = recommendations.build()
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Пользователей с рекомендациями: {written}')
+        )
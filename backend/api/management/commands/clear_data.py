@@ -48,8 +48,22 @@ def handle(self, *args, **options):
         
         # Получаем список всех таблиц
         with connection.cursor() as cursor:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = [table[0] for table in cursor.fetchall()]
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table';")
+            rows = cursor.fetchall()
+            # Служебные таблицы виртуальных таблиц (FTS5: _data, _idx,
+            # _config, ...) очищает только сам модуль, иначе индекс
+            # повреждается
+            virtual_tables = [
+                name for name, sql in rows
+                if (sql or '').upper().startswith('CREATE VIRTUAL TABLE')
+            ]
+            tables = [
+                name for name, _ in rows
+                if not any(
+                    name.startswith(f'{virtual}_')
+                    for virtual in virtual_tables
+                )
+            ]
             
             self.stdout.write(self.style.WARNING(f'Найдено таблиц: {len(tables)}'))
             
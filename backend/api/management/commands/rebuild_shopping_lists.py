@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает списки покупок пользователей из корзин'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Пересобрать только для пользователя с этим id',
+        )
+
+    def handle(self, *args, **options):
+        created = shopping_list.rebuild(options['user_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Позиций в списках покупок: {created}')
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes import similar
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает списки похожих рецептов по общим ингредиентам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Пересчитать только рецепты из очереди изменённых'
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            refreshed = similar.refresh_pending()
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Пересчитано рецептов: {refreshed}')
+            )
+            return
+        created = similar.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Пар похожих рецептов: {created}')
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного, корзин, подписчиков и рецептов'
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Исправлено объектов: {fixed}')
+        )
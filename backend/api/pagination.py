@@ -0,0 +1,141 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+from recipes.cache import get_count_version
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт count из кэша по ключу cache_key.
+    Кэш сбрасывается при изменении рецептов и их тегов, а количества
+    с фильтрами по избранному и корзине — при изменениях пользователя
+    user_id (recipes.signals, recipes.services), поэтому значение может
+    быть неточным лишь в пределах RECIPE_COUNT_CACHE_TIMEOUT."""
+
+    def __init__(self, *args, cache_key=None, user_id=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.user_id = user_id
+        self.count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        version = get_count_version(self.user_id)
+        key = f'recipes:count:{version}:{self.cache_key}'
+        count = cache.get(key)
+        if count is not None:
+            self.count_is_exact = False
+            return count
+        count = super().count
+        cache.set(key, count, settings.RECIPE_COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset-пагинация ленты рецептов по (-created_at, id)."""
+    ordering = ('-created_at', 'id')
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    """Keyset-пагинация списка подписок по id автора."""
+    ordering = ('id',)
+
+
+class FeedPagination(CursorPagination):
+    """Keyset-пагинация ленты подписок по индексу (user, -created_at)."""
+    ordering = ('-created_at', '-recipe_id')
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """Пагинация по номеру страницы (?page=) с переходом на keyset
+    по запросу клиента: ?pagination=cursor для первой страницы,
+    далее по ссылкам next/previous с параметром cursor."""
+    cursor_pagination_class = None
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(OptInCursorPagination):
+    """Пагинация рецептов с кэшированным count для каждого
+    набора фильтров."""
+    cursor_pagination_class = RecipeCursorPagination
+    # Фильтры, результат которых зависит от пользователя
+    user_filters = ('is_favorited', 'is_in_shopping_cart')
+    # Сортировка не меняет количество
+    ordering_query_param = 'ordering'
+
+    def get_count_cache_key(self, request):
+        ignored = {
+            self.page_query_param, self.page_size_query_param,
+            self.cursor_query_param, self.mode_query_param,
+            self.ordering_query_param,
+        }
+        params = sorted(
+            (name, sorted(request.query_params.getlist(name)))
+            for name in request.query_params
+            if name not in ignored
+        )
+        raw = repr((params, self.get_count_user_id(request))).encode()
+        return hashlib.md5(raw).hexdigest()
+
+    def get_count_user_id(self, request):
+        """Пользователь, от избранного и корзины которого зависит
+        количество, или None."""
+        if any(name in request.query_params for name in self.user_filters):
+            return request.user.pk
+        return None
+
+    def django_paginator_class(self, object_list, per_page):
+        return CachedCountPaginator(
+            object_list, per_page, cache_key=self.count_cache_key,
+            user_id=self.count_user_id
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_cache_key = self.get_count_cache_key(request)
+        self.count_user_id = self.get_count_user_id(request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_exact': self.page.paginator.count_is_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class SubscriptionPagination(OptInCursorPagination):
+    cursor_pagination_class = SubscriptionCursorPagination
@@ -105,6 +105,31 @@
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# На общем кэше держатся версии ключей, блокировки single-flight,
+# ETag и готовые файлы списков покупок (recipes.cache), поэтому при
+# нескольких процессах gunicorn нужен Redis. LocMemCache без REDIS_URL
+# годится только для разработки и тестов: в нём всё это действует
+# в пределах одного процесса (см. manage.py check --deploy)
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -167,6 +192,61 @@
     'PAGE_SIZE': 6,
 }
 
+# Время жизни закэшированного количества рецептов в списках, секунды
+RECIPE_COUNT_CACHE_TIMEOUT = int(os.getenv('RECIPE_COUNT_CACHE_TIMEOUT', 60))
+
+# Время жизни кэша ответа GET /api/recipes/{id}/, секунды
+RECIPE_DETAIL_CACHE_TIMEOUT = int(os.getenv('RECIPE_DETAIL_CACHE_TIMEOUT', 300))
+
+# Время жизни готовых файлов списка покупок, секунды
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', 3600)
+)
+
+# TrueType-шрифт с кириллицей для выгрузки списка покупок в PDF
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# max-age справочников (теги, ингредиенты); после него клиент
+# перепроверяет ответ по ETag
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 60))
+
+# Как часто индекс подсказок по названиям рецептов перестраивается
+# целиком (обновляются веса популярности), секунды
+RECIPE_SUGGEST_REBUILD_INTERVAL = int(
+    os.getenv('RECIPE_SUGGEST_REBUILD_INTERVAL', 600)
+)
+
+# Сколько похожих рецептов хранится для каждого рецепта
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', 12))
+
+# Ингредиенты, которые есть в большем числе рецептов (соль, вода), не
+# делают рецепты похожими: иначе пересчёт читал бы почти всю таблицу
+SIMILAR_RECIPES_MAX_POSTINGS = int(
+    os.getenv('SIMILAR_RECIPES_MAX_POSTINGS', 1000)
+)
+
+# Сколько рекомендованных рецептов хранится для каждого пользователя
+RECOMMENDED_RECIPES_COUNT = int(os.getenv('RECOMMENDED_RECIPES_COUNT', 50))
+
+# Сколько последних рецептов автора отдаётся в подписках без
+# recipes_limit и сколько можно запросить с ним
+SUBSCRIPTION_RECIPES_LIMIT = int(os.getenv('SUBSCRIPTION_RECIPES_LIMIT', 3))
+SUBSCRIPTION_RECIPES_MAX_LIMIT = int(
+    os.getenv('SUBSCRIPTION_RECIPES_MAX_LIMIT', 50)
+)
+
+# Рецепты авторов, у которых подписчиков больше этого числа, не
+# раскладываются по лентам при создании, а подтягиваются при чтении
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 1000))
+
+# Как часто пересчитывается список таких авторов, секунды
+FEED_PULL_AUTHORS_CACHE_TIMEOUT = int(
+    os.getenv('FEED_PULL_AUTHORS_CACHE_TIMEOUT', 300)
+)
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
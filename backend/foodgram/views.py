@@ -2,6 +2,7 @@
 from django.views.generic import TemplateView, ListView
 from django.http import Http404
 from recipes.models import Recipe
+from api.pagination import CachedCountPaginator
 
 
 def custom_404(request, exception=None):
@@ -19,9 +20,18 @@ class HomeView(ListView):
     template_name = 'index.html'
     context_object_name = 'recipes'
     paginate_by = 6
+    paginator_class = CachedCountPaginator
+    
+    def get_paginator(self, queryset, per_page, **kwargs):
+        # Главная страница без фильтров: один общий ключ count
+        return super().get_paginator(
+            queryset, per_page, cache_key='home', **kwargs
+        )
     
     def get_queryset(self):
-        return Recipe.objects.all().order_by('-created_at')
+        return Recipe.objects.for_read(
+            self.request.user
+        ).order_by('-created_at')
 
 
 class AboutView(TemplateView):
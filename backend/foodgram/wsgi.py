@@ -14,3 +14,8 @@
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+# Индексы подсказок строятся при старте воркера
+from recipes.search import warm_up  # noqa: E402
+
+warm_up()
@@ -2,19 +2,16 @@
 from .models import (
     Recipe, Ingredient, Tag,
     RecipeIngredient, Favorite,
-    ShoppingCart, Subscription
+    ShoppingCart, Subscription, ShoppingListItem
 )
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorites_count')
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username', 'author__email')
     list_filter = ('tags',)
-    readonly_fields = ('favorites_count',)
-
-    def favorites_count(self, obj):
-        return obj.favorited_by.count()
-    favorites_count.short_description = 'Добавлений в избранное'
+    readonly_fields = ('favorites_count', 'in_carts_count')
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -29,4 +26,10 @@ class TagAdmin(admin.ModelAdmin):
 admin.site.register(RecipeIngredient)
 admin.site.register(Favorite)
 admin.site.register(ShoppingCart)
-admin.site.register(Subscription)
\ No newline at end of file
+admin.site.register(Subscription)
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    list_select_related = ('user', 'ingredient')
+    search_fields = ('user__email', 'ingredient__name')
\ No newline at end of file
@@ -0,0 +1,238 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+RECIPE_COUNT_VERSION_KEY = 'recipes:count_version'
+CATALOG_VERSION_KEY = 'recipes:catalog_version'
+SHOPPING_LISTS_EPOCH_KEY = 'recipes:shopping_lists_epoch'
+RECIPE_NAMES_VERSION_KEY = 'recipes:names_version'
+PANTRY_VERSION_KEY = 'recipes:pantry_version'
+
+# Single-flight: сколько держится блокировка пересчёта и сколько
+# остальные процессы ждут результата, прежде чем считать сами
+BUILD_LOCK_TIMEOUT = 10
+BUILD_WAIT_TIMEOUT = 0.5
+BUILD_WAIT_INTERVAL = 0.05
+
+
+def _bump(key):
+    """Увеличивает счётчик версии; при отсутствии ключа начинает
+    с текущего времени, чтобы не воскресить старые записи.
+    Возвращает новую версию."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def _count_version_key(user_id):
+    return f'{RECIPE_COUNT_VERSION_KEY}:{user_id}'
+
+
+def get_count_version(user_id=None):
+    """Версия кэша количества рецептов в списках. Для списков
+    с фильтрами по избранному и корзине пользователя user_id к ней
+    добавляется его версия."""
+    version = cache.get_or_set(RECIPE_COUNT_VERSION_KEY, time.time_ns(), None)
+    if user_id is None:
+        return version
+    user_version = cache.get_or_set(
+        _count_version_key(user_id), time.time_ns(), None
+    )
+    return f'{version}.{user_version}'
+
+
+def invalidate_counts(user_ids=None):
+    """Сбрасывает количества рецептов; с user_ids — только для
+    фильтров по избранному и корзине этих пользователей."""
+    if user_ids is None:
+        _bump(RECIPE_COUNT_VERSION_KEY)
+        return
+    for user_id in user_ids:
+        _bump(_count_version_key(user_id))
+
+
+def get_recipe_names_version():
+    """Версия названий рецептов для индексов подсказок в процессах."""
+    return cache.get_or_set(RECIPE_NAMES_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_recipe_names():
+    return _bump(RECIPE_NAMES_VERSION_KEY)
+
+
+def get_pantry_version():
+    """Версия составов, тегов и времени приготовления рецептов
+    для индексов подбора по продуктам (recipes.pantry)."""
+    return cache.get_or_set(PANTRY_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_pantry():
+    _bump(PANTRY_VERSION_KEY)
+
+
+def get_catalog_version():
+    """Версия справочников (теги и ингредиенты)."""
+    return cache.get_or_set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_catalog():
+    _bump(CATALOG_VERSION_KEY)
+
+
+def _shopping_list_version_key(user_id):
+    return f'recipes:shopping_list_version:{user_id}'
+
+
+def get_shopping_list_version(user_id):
+    """Версия списка покупок пользователя: общая эпоха (пересборка всех
+    списков), версия справочников и версия самого списка."""
+    key = _shopping_list_version_key(user_id)
+    versions = cache.get_many([SHOPPING_LISTS_EPOCH_KEY, key])
+    if SHOPPING_LISTS_EPOCH_KEY not in versions:
+        versions[SHOPPING_LISTS_EPOCH_KEY] = cache.get_or_set(
+            SHOPPING_LISTS_EPOCH_KEY, time.time_ns(), None
+        )
+    if key not in versions:
+        versions[key] = cache.get_or_set(key, time.time_ns(), None)
+    return (
+        f'{versions[SHOPPING_LISTS_EPOCH_KEY]}.{get_catalog_version()}.'
+        f'{versions[key]}'
+    )
+
+
+def invalidate_shopping_lists(user_ids=None):
+    """Сбрасывает версии списков покупок; None — для всех пользователей."""
+    if user_ids is None:
+        _bump(SHOPPING_LISTS_EPOCH_KEY)
+        return
+    for user_id in user_ids:
+        _bump(_shopping_list_version_key(user_id))
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _needs_refresh(entry, beta):
+    """Вероятностное досрочное обновление (XFetch): чем ближе срок
+    и дольше пересчёт, тем чаще запись пересчитывается заранее."""
+    jitter = -entry['delta'] * beta * math.log(1.0 - random.random())
+    return time.time() + jitter >= entry['expires']
+
+
+def _build_and_store(keys, stamps, build_many, timeout):
+    started = time.time()
+    try:
+        values = build_many(keys)
+        delta = time.time() - started
+        expires = time.time() + timeout
+        # Запись хранится вдвое дольше срока, чтобы было что отдать,
+        # пока другой процесс её пересчитывает
+        cache.set_many({
+            key: {
+                'stamp': stamps[key], 'value': values[key],
+                'expires': expires, 'delta': delta,
+            }
+            for key in keys if key in values
+        }, timeout * 2)
+    finally:
+        cache.delete_many([_lock_key(key) for key in keys])
+    return values
+
+
+def _wait_for(keys, stamps):
+    result = {}
+    deadline = time.time() + BUILD_WAIT_TIMEOUT
+    while keys and time.time() < deadline:
+        time.sleep(BUILD_WAIT_INTERVAL)
+        for key, entry in cache.get_many(keys).items():
+            if entry['stamp'] == stamps[key]:
+                result[key] = entry['value']
+        keys = [key for key in keys if key not in result]
+    return result
+
+
+def get_many_or_build(stamps, build_many, timeout, beta=1.0):
+    """Значения по ключам stamps ({ключ: отметка актуальности}).
+    Устаревшие и отсутствующие ключи пересчитывает один вызывающий
+    (build_many(keys) -> {ключ: значение}), остальные получают
+    прежнее значение или недолго ждут результат."""
+    entries = cache.get_many(list(stamps))
+    result, stale, missing = {}, {}, []
+    for key, stamp in stamps.items():
+        entry = entries.get(key)
+        if (entry is not None and entry['stamp'] == stamp
+                and not _needs_refresh(entry, beta)):
+            result[key] = entry['value']
+            continue
+        if entry is not None:
+            stale[key] = entry['value']
+        missing.append(key)
+    if not missing:
+        return result
+
+    owned = [
+        key for key in missing
+        if cache.add(_lock_key(key), 1, BUILD_LOCK_TIMEOUT)
+    ]
+    if owned:
+        result.update(_build_and_store(owned, stamps, build_many, timeout))
+    waiting = [
+        key for key in missing if key not in owned and key not in stale
+    ]
+    result.update({
+        key: value for key, value in stale.items() if key not in result
+    })
+    if waiting:
+        result.update(_wait_for(waiting, stamps))
+        leftovers = [key for key in waiting if key not in result]
+        if leftovers:
+            result.update(build_many(leftovers))
+    return result
+
+
+def _recipe_key(recipe_id):
+    return f'recipes:payload:{recipe_id}'
+
+
+def get_recipe_payloads(updated_at_by_id, build_many):
+    """Не зависящая от пользователя часть RecipeSerializer для рецептов
+    {id: updated_at}. Запись действительна, пока не изменились updated_at
+    рецепта и версия справочников; build_many(ids) -> {id: данные}.
+    Ссылки на медиафайлы хранятся относительными."""
+    catalog_version = get_catalog_version()
+    stamps = {
+        _recipe_key(recipe_id): (updated_at.isoformat(), catalog_version)
+        for recipe_id, updated_at in updated_at_by_id.items()
+    }
+    ids_by_key = {_recipe_key(recipe_id): recipe_id
+                  for recipe_id in updated_at_by_id}
+
+    def build(keys):
+        values = build_many([ids_by_key[key] for key in keys])
+        return {_recipe_key(recipe_id): value
+                for recipe_id, value in values.items()}
+
+    payloads = get_many_or_build(
+        stamps, build, settings.RECIPE_DETAIL_CACHE_TIMEOUT
+    )
+    return {ids_by_key[key]: value for key, value in payloads.items()}
+
+
+def invalidate_recipes(recipe_ids):
+    cache.delete_many([_recipe_key(recipe_id) for recipe_id in recipe_ids])
+
+
+def cache_streamed(key, chunks, timeout):
+    """Отдаёт части потока и после последней сохраняет их в кэш целиком."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(parts), timeout)
@@ -0,0 +1,39 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Версии ключей и блокировки кэша (recipes.cache) должны быть
+    общими для всех процессов сервера."""
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        'Кэш по умолчанию не общий для процессов сервера.',
+        hint='Задайте REDIS_URL: иначе сброс кэша рецептов, ETag и '
+             'блокировки перестроения действуют только в одном процессе.',
+        id='recipes.W001',
+    )]
+
+
+@register()
+def check_pdf_font(app_configs, **kwargs):
+    """Выгрузка списка покупок в PDF печатает кириллицу шрифтом
+    SHOPPING_LIST_PDF_FONT. Без шрифта не работает только PDF
+    (PDFRenderer.get_font), поэтому это предупреждение."""
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if os.path.isfile(font_path):
+        return []
+    return [Warning(
+        f'Не найден шрифт для PDF списка покупок: {font_path}.',
+        hint='Укажите в SHOPPING_LIST_PDF_FONT путь к TrueType-шрифту '
+             'с кириллицей (например, DejaVuSans.ttf из fonts-dejavu).',
+        id='recipes.W002',
+    )]
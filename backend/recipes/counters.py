@@ -0,0 +1,70 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import User
+
+from .models import Favorite, Recipe, ShoppingCart, Subscription
+
+
+def bump(model, field, ids, delta):
+    """Атомарно меняет счётчик field у объектов ids на delta
+    (UPDATE ... SET field = field + delta), не опускаясь ниже нуля."""
+    if ids:
+        model.objects.filter(pk__in=ids).update(
+            **{field: Greatest(F(field) + delta, Value(0))}
+        )
+
+
+def favorites_changed(recipe_ids, delta):
+    bump(Recipe, 'favorites_count', recipe_ids, delta)
+
+
+def carts_changed(recipe_ids, delta):
+    bump(Recipe, 'in_carts_count', recipe_ids, delta)
+
+
+def subscribers_changed(author_ids, delta):
+    bump(User, 'subscribers_count', author_ids, delta)
+
+
+def recipes_changed(author_ids, delta):
+    bump(User, 'recipes_count', author_ids, delta)
+
+
+def _count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field).annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def reconcile():
+    """Пересчитывает все счётчики по данным связей.
+    Возвращает число исправленных объектов."""
+    fixed = 0
+    for model, counters in (
+        (Recipe, {
+            'favorites_count': _count(Favorite, 'recipe'),
+            'in_carts_count': _count(ShoppingCart, 'recipe'),
+        }),
+        (User, {
+            'subscribers_count': _count(Subscription, 'author'),
+            'recipes_count': _count(Recipe, 'author'),
+        }),
+    ):
+        drifted = Q()
+        for field in counters:
+            drifted |= ~Q(**{field: F(f'actual_{field}')})
+        ids = list(
+            model.objects.annotate(**{
+                f'actual_{field}': value for field, value in counters.items()
+            }).filter(drifted).values_list('pk', flat=True)
+        )
+        if ids:
+            model.objects.filter(pk__in=ids).update(**counters)
+        fixed += len(ids)
+    return fixed
@@ -0,0 +1,122 @@
+import csv
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import renderers
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Формат выгрузки списка покупок. Выбирается DRF по ?format=
+    или Accept; файл целиком формирует generate(), а render() нужен
+    только для ответов с ошибками."""
+    charset = 'utf-8'
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode('utf-8')
+
+    def generate(self, rows):
+        """Итератор байтовых частей файла по строкам
+        (название, единица измерения, количество)."""
+        raise NotImplementedError
+
+
+class TextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def generate(self, rows):
+        separator = ''
+        for name, unit, amount in rows:
+            yield f'{separator}{name} ({unit}) — {amount}'.encode('utf-8')
+            separator = '\n'
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer, возвращающий строку."""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Единица измерения', 'Количество')
+
+    def generate(self, rows):
+        writer = csv.writer(_Echo())
+        # BOM, чтобы Excel распознал кодировку
+        yield '\ufeff'.encode('utf-8')
+        yield writer.writerow(self.header).encode('utf-8')
+        for row in rows:
+            yield writer.writerow(row).encode('utf-8')
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+    chunk_size = 64 * 1024
+
+    def get_font(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            # Встроенные шрифты reportlab без кириллицы: вместо
+            # пустых квадратов в файле — ошибка конфигурации
+            font_path = settings.SHOPPING_LIST_PDF_FONT
+            try:
+                font = TTFont(self.font_name, font_path)
+            except Exception as error:
+                raise ImproperlyConfigured(
+                    f'SHOPPING_LIST_PDF_FONT: не удалось загрузить '
+                    f'шрифт {font_path}: {error}'
+                ) from error
+            pdfmetrics.registerFont(font)
+        return self.font_name
+
+    def generate(self, rows):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        width, height = A4
+        margin, line_height = 50, 18
+
+        pdf.setFont(font, 16)
+        pdf.drawString(margin, height - margin, 'Список покупок')
+        y = height - margin - 2 * line_height
+        pdf.setFont(font, 12)
+        for name, unit, amount in rows:
+            if y < margin:
+                pdf.showPage()
+                pdf.setFont(font, 12)
+                y = height - margin
+            pdf.drawString(margin, y, f'• {name} ({unit}) — {amount}')
+            y -= line_height
+        pdf.save()
+
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+SHOPPING_LIST_RENDERERS = [TextRenderer, CSVRenderer, PDFRenderer]
@@ -0,0 +1,143 @@
+import heapq
+from itertools import islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F
+
+from .models import FeedItem, Recipe, Subscription
+
+PULL_AUTHORS_KEY = 'recipes:feed:pull-authors'
+# Последний посчитанный набор без срока хранения: по нему видно,
+# какие авторы снова раскладываются при создании рецепта
+PREVIOUS_PULL_AUTHORS_KEY = 'recipes:feed:pull-authors:previous'
+
+
+def get_pull_authors():
+    """Авторы, у которых подписчиков больше FEED_FANOUT_MAX_FOLLOWERS.
+    Их рецепты не раскладываются по лентам при создании."""
+    authors = cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = set(
+            Subscription.objects.values('author_id')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+            .values_list('author_id', flat=True)
+        )
+        dropped = cache.get(PREVIOUS_PULL_AUTHORS_KEY, set()) - authors
+        if dropped:
+            authors_dropped(dropped)
+        cache.set(PREVIOUS_PULL_AUTHORS_KEY, authors, None)
+        cache.set(
+            PULL_AUTHORS_KEY, authors,
+            settings.FEED_PULL_AUTHORS_CACHE_TIMEOUT
+        )
+    return authors
+
+
+def _fill(condition, params):
+    """Добавляет в ленты подписчиков рецепты их авторов, отобранные
+    условием condition (s — подписка, r — рецепт), одним
+    INSERT ... SELECT. Уже разложенные рецепты пропускаются."""
+    qn = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {qn(FeedItem._meta.db_table)} '
+        f'({qn("user_id")}, {qn("recipe_id")}, {qn("created_at")}) '
+        f'SELECT s.{qn("user_id")}, r.{qn("id")}, r.{qn("created_at")} '
+        f'FROM {qn(Subscription._meta.db_table)} s '
+        f'JOIN {qn(Recipe._meta.db_table)} r '
+        f'ON r.{qn("author_id")} = s.{qn("author_id")} '
+        f'WHERE {condition} ON CONFLICT DO NOTHING'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def fan_out(recipe):
+    """Новый рецепт попадает в ленты всех подписчиков автора."""
+    if recipe.author_id in get_pull_authors():
+        return
+    _fill(f'r.{connection.ops.quote_name("id")} = %s', [recipe.pk])
+
+
+def author_followed(user_id, author_id):
+    """Подписка: в ленту добавляются все рецепты автора."""
+    qn = connection.ops.quote_name
+    _fill(
+        f's.{qn("user_id")} = %s AND s.{qn("author_id")} = %s',
+        [user_id, author_id]
+    )
+
+
+def author_unfollowed(user_id, author_id):
+    FeedItem.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def authors_dropped(author_ids):
+    """Авторы больше не читаются при запросе ленты: их рецепты,
+    пропущенные fan_out, раскладываются по лентам подписчиков."""
+    qn = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    _fill(f's.{qn("author_id")} IN ({placeholders})', list(author_ids))
+
+
+class FeedQuerySet:
+    """Лента пользователя для CursorPagination: записи FeedItem
+    и рецепты авторов из get_pull_authors, которые сливаются при
+    чтении (fan-out on read). Поддерживает только то, что вызывает
+    пагинатор: order_by, filter по позиции курсора и срез; каждый
+    источник читается не дальше конца среза."""
+
+    def __init__(self, sources, descending=True):
+        self.sources = sources
+        self.descending = descending
+
+    def order_by(self, *fields):
+        return FeedQuerySet(
+            [source.order_by(*fields) for source in self.sources],
+            fields[0].startswith('-')
+        )
+
+    def filter(self, **kwargs):
+        return FeedQuerySet(
+            [source.filter(**kwargs) for source in self.sources],
+            self.descending
+        )
+
+    def _merged(self, stop):
+        previous = None
+        for row in heapq.merge(
+            *(source[:stop] for source in self.sources),
+            key=itemgetter('created_at', 'recipe_id'),
+            reverse=self.descending
+        ):
+            # Рецепт, разложенный до того, как автор стал читаться
+            # при запросе, есть в обоих источниках
+            if row['recipe_id'] != previous:
+                previous = row['recipe_id']
+                yield row
+
+    def __getitem__(self, item):
+        return list(islice(self._merged(item.stop), item.start, item.stop))
+
+
+def get_feed(user_id):
+    """Лента пользователя: строки {'recipe_id', 'created_at'}."""
+    sources = [
+        FeedItem.objects.filter(user_id=user_id)
+        .values('recipe_id', 'created_at')
+    ]
+    authors = get_pull_authors()
+    if authors:
+        sources.append(
+            Recipe.objects.filter(
+                author_id__in=Subscription.objects.filter(
+                    user_id=user_id, author_id__in=authors
+                ).values('author_id')
+            ).annotate(recipe_id=F('id')).values('recipe_id', 'created_at')
+        )
+    return FeedQuerySet(sources)
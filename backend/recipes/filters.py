@@ -1,5 +1,9 @@
 import django_filters
+from django.db.models import Count
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
 from .models import Recipe, Ingredient
+from .fulltext import search
+from .search import normalize_name
 
 class RecipeFilter(django_filters.FilterSet):
     tags = django_filters.CharFilter(method='filter_tags')
@@ -13,10 +17,21 @@ class Meta:
         fields = ['author', 'tags']
 
     def filter_tags(self, queryset, name, value):
-        tag_slugs = self.request.query_params.getlist('tags')
-        for slug in tag_slugs:
-            queryset = queryset.filter(tags__slug=slug)
-        return queryset.distinct()
+        # Рецепт должен содержать все выбранные теги. Один IN-запрос
+        # к промежуточной таблице с группировкой вместо отдельного JOIN
+        # на каждый тег и DISTINCT по всей выборке.
+        tag_slugs = {
+            slug for slug in self.request.query_params.getlist('tags')
+            if slug
+        }
+        if not tag_slugs:
+            return queryset
+        matching = Recipe.tags.through.objects.filter(
+            tag__slug__in=tag_slugs
+        ).values('recipe_id').annotate(
+            matched=Count('tag_id')
+        ).filter(matched=len(tag_slugs)).values('recipe_id')
+        return queryset.filter(id__in=matching)
 
     def filter_favorited(self, queryset, name, value):
         user = self.request.user
@@ -31,8 +46,48 @@ def filter_shopping_cart(self, queryset, name, value):
         return queryset
 
 class IngredientFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='istartswith')
+    name = django_filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
-        fields = ['name']
\ No newline at end of file
+        fields = ['name']
+
+    def filter_name(self, queryset, name, value):
+        # Диапазон по индексу search_name вместо istartswith:
+        # LIKE не использует индекс и не понижает регистр кириллицы
+        prefix = normalize_name(value)
+        return queryset.filter(
+            search_name__gte=prefix,
+            search_name__lt=prefix + '\U0010ffff'
+        )
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск ?search= по названию и описанию
+    (recipes.fulltext)."""
+    search_param = 'search'
+
+    def get_search_query(self, request):
+        """Запрос без пробелов по краям; пустая строка — поиска нет."""
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if not query:
+            return queryset
+        return search(queryset, query)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """?ordering= с id в конце, чтобы страницы не перемешивались
+    при равных значениях счётчиков. При поиске без ?ordering=
+    сначала идут самые релевантные рецепты."""
+
+    def get_ordering(self, request, queryset, view):
+        if (self.ordering_param not in request.query_params
+                and RecipeSearchFilter().get_search_query(request)):
+            return ['-search_rank', 'id']
+        ordering = list(super().get_ordering(request, queryset, view) or [])
+        if ordering and not {'id', '-id'} & set(ordering):
+            ordering.append('id')
+        return ordering
@@ -1,7 +1,15 @@
+import json
+
 from django import forms
-from .models import Recipe
+from .models import Recipe, Ingredient, Tag
 
 class RecipeForm(forms.ModelForm):
+    tags = forms.ModelMultipleChoiceField(
+        queryset=Tag.objects.all(), required=False
+    )
+    # JSON-список [{"id": ..., "amount": ...}] из recipe_form.js
+    ingredients_data = forms.CharField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Recipe
         fields = ['name', 'text', 'cooking_time', 'image']
@@ -10,4 +18,32 @@ class Meta:
             'text': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'cooking_time': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
             'image': forms.FileInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+    def clean_ingredients_data(self):
+        """Возвращает {ingredient_id: amount} или None, если поле не
+        передано. Все id проверяются одним запросом."""
+        raw = self.cleaned_data['ingredients_data']
+        if not raw:
+            return None
+        try:
+            items = json.loads(raw)
+            pairs = [(int(item['id']), int(item['amount'])) for item in items]
+        except (ValueError, TypeError, KeyError):
+            raise forms.ValidationError(
+                'Не удалось разобрать список ингредиентов.'
+            )
+        amounts = dict(pairs)
+        if len(amounts) != len(pairs):
+            raise forms.ValidationError('Ингредиенты не должны повторяться.')
+        if any(amount < 1 for amount in amounts.values()):
+            raise forms.ValidationError(
+                'Количество ингредиента должно быть не меньше 1.'
+            )
+        found = Ingredient.objects.in_bulk(list(amounts))
+        missing = [pk for pk in amounts if pk not in found]
+        if missing:
+            raise forms.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(map(str, missing))}.'
+            )
+        return amounts
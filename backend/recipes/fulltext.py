@@ -0,0 +1,86 @@
+import re
+
+import snowballstemmer
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db import connection
+from django.db.models import F, Value
+
+from .search import normalize_name
+
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_CONFIG = 'russian'
+# Вес совпадения в названии относительно описания (bm25 в FTS5)
+NAME_WEIGHT = 10.0
+
+_word = re.compile(r'\w+')
+
+
+def stem_words(text):
+    """Основы слов текста (snowball, русский)."""
+    # Стеммер хранит состояние, поэтому создаётся на каждый вызов
+    stemmer = snowballstemmer.stemmer(SEARCH_CONFIG)
+    return stemmer.stemWords(_word.findall(normalize_name(text or '')))
+
+
+def stem_text(text):
+    return ' '.join(stem_words(text))
+
+
+def uses_fts5():
+    return connection.vendor == 'sqlite'
+
+
+def index_recipe(recipe):
+    """Обновляет строку FTS5-индекса рецепта. В PostgreSQL индекс
+    по выражению поддерживается самой базой."""
+    if not uses_fts5():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f'VALUES (%s, %s, %s)',
+            [recipe.pk, stem_text(recipe.name), stem_text(recipe.text)]
+        )
+
+
+def unindex_recipe(recipe_id):
+    if not uses_fts5():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+        )
+
+
+def search_vector():
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def search(queryset, query):
+    """Рецепты queryset, подходящие под запрос, с аннотацией
+    search_rank (больше — релевантнее)."""
+    if not uses_fts5():
+        query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        vector = search_vector()
+        return queryset.annotate(
+            search_document=vector,
+            search_rank=SearchRank(vector, query),
+        ).filter(search_document=query)
+    words = stem_words(query)
+    if not words:
+        return queryset.none().annotate(search_rank=Value(0.0))
+    # Все слова запроса, каждое как префикс основы
+    match = ' '.join(f'"{word}"*' for word in words)
+    return queryset.filter(
+        search_entry__document__match=match
+    ).annotate(search_rank=-F('search_entry__rank'))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 00:56
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    ingredients = list(Ingredient.objects.only('id', 'name'))
+    for ingredient in ingredients:
+        ingredient.search_name = (
+            ingredient.name.strip().casefold().replace('ё', 'е')
+        )
+    Ingredient.objects.bulk_update(
+        ingredients, ['search_name'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 01:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import recipes.models
+from recipes.fulltext import FTS_TABLE, NAME_WEIGHT, stem_text
+
+# Выражение совпадает с recipes.fulltext.search_vector, иначе
+# планировщик PostgreSQL не использует индекс
+PG_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, COALESCE(name, '')), 'A')"
+    " || setweight(to_tsvector('russian'::regconfig, COALESCE(text, '')), 'B')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX recipe_search_idx ON recipes_recipe '
+            f'USING GIN (({PG_VECTOR}))'
+        )
+        return
+    if connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"name, text, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) "
+        f"VALUES ('rank', 'bm25({NAME_WEIGHT}, 1.0)')"
+    )
+    Recipe = apps.get_model('recipes', 'Recipe')
+    with connection.cursor() as cursor:
+        for pk, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text'
+        ).iterator():
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'VALUES (%s, %s, %s)',
+                [pk, stem_text(name), stem_text(text)]
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchEntry',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='recipes.recipe')),
+                ('name', models.TextField()),
+                ('text', models.TextField()),
+                ('document', recipes.models.SearchDocumentField(db_column='recipes_recipe_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'recipes_recipe_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipeRefresh',
+            fields=[
+                ('recipe_id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'verbose_name': 'Пересчёт похожих рецептов',
+                'verbose_name_plural': 'Очередь пересчёта похожих рецептов',
+            },
+        ),
+    ]
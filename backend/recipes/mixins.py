@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import get_catalog_version
+
+
+class VersionedPayloadCache:
+    """Кэш сериализованных ответов в памяти процесса.
+    Все записи сбрасываются при смене версии; размер ограничен LRU."""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.version = None
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_or_build(self, version, key, build):
+        with self.lock:
+            if self.version != version:
+                self.items.clear()
+                self.version = version
+            elif key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+        data = build()
+        with self.lock:
+            if self.version == version:
+                self.items[key] = data
+                if len(self.items) > self.max_size:
+                    self.items.popitem(last=False)
+        return data
+
+
+catalog_payloads = VersionedPayloadCache()
+
+
+class CatalogCacheMixin:
+    """ETag, Cache-Control и кэш ответов для справочников
+    (теги, ингредиенты) по версии recipes.cache.get_catalog_version."""
+
+    def catalog_response(self, request, build):
+        version = get_catalog_version()
+        etag = quote_etag(
+            f'catalog-{version}-{request.accepted_renderer.format}'
+        )
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = (type(self).__name__, request.get_full_path())
+            response = Response(
+                catalog_payloads.get_or_build(version, key, build)
+            )
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE
+        )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(
+            request,
+            lambda: super(CatalogCacheMixin, self).list(
+                request, *args, **kwargs
+            ).data
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_response(
+            request,
+            lambda: super(CatalogCacheMixin, self).retrieve(
+                request, *args, **kwargs
+            ).data
+        )
@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models import (
+    Exists, F, Lookup, OuterRef, Prefetch, Value, Window
+)
+from django.db.models.functions import RowNumber
 from django.core.validators import MinValueValidator
-from users.models import User
+from users.models import CounterFieldsMixin, User
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -17,6 +21,11 @@ def __str__(self):
 class Ingredient(models.Model):
     name = models.CharField(max_length=200, db_index=True)
     measurement_unit = models.CharField(max_length=20)
+    # Название для поиска по префиксу: без регистра, ё → е
+    # (заполняется сигналом recipes.signals.fill_ingredient_search_name)
+    search_name = models.CharField(
+        max_length=200, db_index=True, editable=False, default=''
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -25,7 +34,58 @@ class Meta:
     def __str__(self):
         return self.name
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Аннотирует флаги is_favorited, is_in_shopping_cart
+        и author_is_subscribed для пользователя."""
+        if not user or not user.is_authenticated:
+            false = Value(False, output_field=models.BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            author_is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef('author')
+                )
+            ),
+        )
+
+    def for_read(self, user):
+        """Queryset для чтения: автор, теги и ингредиенты загружаются
+        фиксированным числом запросов независимо от размера страницы."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        ).with_user_flags(user)
+
+    def latest_by_author(self, author_ids, limit=None):
+        """Последние limit рецептов каждого автора одним запросом
+        (ROW_NUMBER() OVER (PARTITION BY author_id))."""
+        recipes = self.filter(author_id__in=author_ids)
+        ordering = [F('created_at').desc(), F('id').desc()]
+        if limit is None:
+            return recipes.order_by('author_id', *ordering)
+        return recipes.annotate(
+            author_row=Window(
+                RowNumber(), partition_by=F('author_id'), order_by=ordering
+            )
+        ).filter(author_row__lte=limit).order_by('author_id', *ordering)
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -45,9 +105,35 @@ class Recipe(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Счётчики меняет recipes.counters через F(); пересчитываются
+    # командой reconcile_counters
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в корзину', default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset-пагинация ленты (api.pagination.RecipeCursorPagination)
+            models.Index(
+                fields=['-created_at', 'id'],
+                name='recipe_created_id_idx'
+            ),
+            # Сортировка по популярности (?ordering=-favorites_count)
+            models.Index(
+                fields=['-favorites_count', 'id'],
+                name='recipe_favorites_idx'
+            ),
+            # Догоняющая синхронизация подсказок (recipes.search)
+            models.Index(fields=['updated_at'], name='recipe_updated_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -145,4 +231,157 @@ class Meta:
             )
         ]
         verbose_name = 'Подписка'
-        verbose_name_plural = 'Подписки'
\ No newline at end of file
+        verbose_name_plural = 'Подписки'
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается recipes.shopping_list в транзакции изменения корзины
+    и ингредиентов рецептов; пересобирается командой
+    rebuild_shopping_lists."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE
+    )
+    amount = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписок пользователя. Заполняется recipes.feed
+    при создании рецепта (fan-out on write) и при подписке; рецепты
+    авторов с очень большим числом подписчиков не записываются,
+    а добавляются к ленте при чтении (recipes.feed.get_feed)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items'
+    )
+    # Копия recipe.created_at: лента читается по индексу без JOIN
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_item'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at'], name='feed_user_created_idx'
+            )
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+
+class SimilarRecipe(models.Model):
+    """Рецепт из списка похожих (по общим ингредиентам) на recipe.
+    Списки top-K заполняет и обновляет recipes.similar."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    # Мера Жаккара для множеств ингредиентов, от 0 до 1
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+
+class SimilarRecipeRefresh(models.Model):
+    """Очередь рецептов, у которых изменился состав и списки похожих
+    нужно пересчитать (recipes.similar.refresh_pending). Без внешнего
+    ключа: рецепт может удаляться в той же транзакции."""
+    recipe_id = models.BigIntegerField(primary_key=True)
+
+    class Meta:
+        verbose_name = 'Пересчёт похожих рецептов'
+        verbose_name_plural = 'Очередь пересчёта похожих рецептов'
+
+
+class Recommendation(models.Model):
+    """Рекомендованные пользователю рецепты, самые подходящие первыми.
+    Одна строка на пользователя, заполняется командой
+    build_recommendations (recipes.recommendations)."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation'
+    )
+    recipe_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Рекомендации'
+        verbose_name_plural = 'Рекомендации'
+
+
+class SearchDocumentField(models.TextField):
+    """Скрытый столбец FTS5-таблицы с её именем; к нему применяется
+    MATCH по всем столбцам сразу."""
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class RecipeSearchEntry(models.Model):
+    """Строка FTS5-индекса рецептов (только SQLite). Таблица создаётся
+    миграцией и заполняется recipes.fulltext основами слов названия
+    и описания; в PostgreSQL вместо неё GIN-индекс по tsvector."""
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name='search_entry'
+    )
+    name = models.TextField()
+    text = models.TextField()
+    document = SearchDocumentField(db_column='recipes_recipe_fts')
+    # bm25 с весами из настройки rank таблицы: меньше — релевантнее
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
@@ -0,0 +1,104 @@
+import heapq
+import threading
+from array import array
+from collections import defaultdict
+
+from .cache import get_catalog_version, get_pantry_version
+from .models import Recipe, RecipeIngredient
+
+
+class PantryIndex:
+    """Инвертированный индекс ингредиент → рецепты в памяти процесса.
+    Рецепты пронумерованы подряд: списки индекса — массивы номеров,
+    число ингредиентов и время приготовления лежат в массивах
+    по тем же номерам."""
+
+    def __init__(self):
+        self.recipe_ids = array('q')
+        self.sizes = array('l')
+        self.cooking_times = array('l')
+        self.postings = defaultdict(lambda: array('l'))
+        self.tags = defaultdict(set)
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        positions = {}
+        rows = Recipe.objects.values_list('id', 'cooking_time').order_by()
+        for recipe_id, cooking_time in rows.iterator():
+            positions[recipe_id] = len(index.recipe_ids)
+            index.recipe_ids.append(recipe_id)
+            index.sizes.append(0)
+            index.cooking_times.append(cooking_time)
+        rows = RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by()
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=10000):
+            position = positions.get(recipe_id)
+            if position is not None:
+                index.postings[ingredient_id].append(position)
+                index.sizes[position] += 1
+        rows = Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag__slug'
+        )
+        for recipe_id, slug in rows.iterator():
+            position = positions.get(recipe_id)
+            if position is not None:
+                index.tags[slug].add(position)
+        return index
+
+    def match(self, ingredient_ids, limit, tags=(), max_cooking_time=None):
+        """Не более limit рецептов, в которых есть хотя бы один из
+        ингредиентов, по убыванию доли имеющихся ингредиентов.
+        Возвращает [(recipe_id, найдено, всего)]. Теги — как в
+        фильтре списка: рецепт должен содержать все."""
+        counts = defaultdict(int)
+        for ingredient_id in set(ingredient_ids):
+            for position in self.postings.get(ingredient_id, ()):
+                counts[position] += 1
+        allowed = None
+        for slug in set(tags):
+            positions = self.tags.get(slug, set())
+            allowed = positions if allowed is None else allowed & positions
+        candidates = (
+            (
+                count / self.sizes[position], count,
+                self.recipe_ids[position], self.sizes[position]
+            )
+            for position, count in counts.items()
+            if (allowed is None or position in allowed)
+            and (
+                max_cooking_time is None
+                or self.cooking_times[position] <= max_cooking_time
+            )
+        )
+        return [
+            (recipe_id, count, size)
+            for _, count, recipe_id, size in heapq.nlargest(limit, candidates)
+        ]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_pantry_index():
+    """Индекс текущего процесса; перестраивается, когда изменились
+    составы, теги или время приготовления рецептов (recipes.signals)
+    либо справочник тегов. Пока один поток перестраивает индекс,
+    остальные получают прежний."""
+    global _index, _index_version
+    version = (get_pantry_version(), get_catalog_version())
+    index = _index
+    if index is not None and _index_version == version:
+        return index
+    if not _index_lock.acquire(blocking=index is None):
+        return index
+    try:
+        if _index is None or _index_version != version:
+            _index = PantryIndex.build()
+            _index_version = version
+    finally:
+        _index_lock.release()
+    return _index
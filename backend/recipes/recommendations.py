@@ -0,0 +1,170 @@
+import heapq
+from array import array
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Favorite, Recommendation, ShoppingCart
+
+# Сколько рецептов пользователя учитывается (самые новые): ограничивает
+# длину строки матрицы
+MAX_USER_ITEMS = 200
+# Параметры ALS: размер векторов, число итераций, регуляризация
+# и вес отмеченного рецепта относительно неотмеченного
+FACTORS = 32
+ITERATIONS = 15
+REGULARIZATION = 0.1
+ALPHA = 40.0
+# Сколько оценок (пользователь × рецепт) считается за один шаг
+SCORE_BATCH_CELLS = 10 ** 7
+WRITE_BATCH_SIZE = 1000
+
+
+def interactions():
+    """Пары (user_id, recipe_id) из избранного и корзин, упорядоченные
+    по пользователю. Читаются потоком по уникальным индексам."""
+    streams = [
+        model.objects.values_list('user_id', 'recipe_id')
+        .order_by('user_id', 'recipe_id').iterator(chunk_size=10000)
+        for model in (Favorite, ShoppingCart)
+    ]
+    return heapq.merge(*streams)
+
+
+class InteractionMatrix:
+    """Разреженная матрица пользователь × рецепт в формате CSR:
+    строка пользователя — номера столбцов indices[indptr[i]:indptr[i + 1]],
+    столбец j — рецепт item_ids[j]. В памяти только массивы numpy."""
+
+    def __init__(self, user_ids, item_ids, indptr, indices):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def load(cls):
+        user_ids = array('q')
+        indptr = array('q', [0])
+        indices = array('q')
+        columns = {}
+        for user_id, rows in groupby(interactions(), key=itemgetter(0)):
+            items = sorted(
+                {recipe_id for _, recipe_id in rows}
+            )[-MAX_USER_ITEMS:]
+            user_ids.append(user_id)
+            indices.extend(
+                columns.setdefault(recipe_id, len(columns))
+                for recipe_id in items
+            )
+            indptr.append(len(indices))
+        return cls(
+            np.frombuffer(user_ids, dtype=np.int64),
+            np.fromiter(columns, dtype=np.int64, count=len(columns)),
+            np.frombuffer(indptr, dtype=np.int64),
+            np.frombuffer(indices, dtype=np.int64),
+        )
+
+    def row(self, index):
+        return self.indices[self.indptr[index]:self.indptr[index + 1]]
+
+    def transpose(self):
+        """(indptr, indices) матрицы рецепт × пользователь."""
+        order = np.argsort(self.indices, kind='stable')
+        rows = np.repeat(
+            np.arange(len(self.user_ids)), np.diff(self.indptr)
+        )
+        counts = np.bincount(self.indices, minlength=len(self.item_ids))
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return indptr, rows[order]
+
+
+def _solve(fixed, indptr, indices, target):
+    """Половина шага ALS для неявной обратной связи (Hu, Koren,
+    Volinsky): при зафиксированных векторах fixed каждая строка target
+    — решение (FᵀF + α·FᵤᵀFᵤ + λI)·x = (1 + α)·ΣFᵤ, где Fᵤ — векторы
+    отмеченных в строке объектов."""
+    fixed64 = fixed.astype(np.float64)
+    gram = fixed64.T @ fixed64 + REGULARIZATION * np.eye(fixed.shape[1])
+    for row in range(len(indptr) - 1):
+        factors = fixed64[indices[indptr[row]:indptr[row + 1]]]
+        if not len(factors):
+            target[row] = 0
+            continue
+        target[row] = np.linalg.solve(
+            gram + ALPHA * factors.T @ factors,
+            (1 + ALPHA) * factors.sum(axis=0)
+        )
+
+
+def factorize(matrix):
+    """Векторы пользователей и рецептов размера FACTORS, скалярное
+    произведение которых приближает отметки пользователя."""
+    random = np.random.default_rng(0)
+    users = np.zeros((len(matrix.user_ids), FACTORS), dtype=np.float32)
+    items = random.normal(
+        scale=0.01, size=(len(matrix.item_ids), FACTORS)
+    ).astype(np.float32)
+    item_indptr, item_indices = matrix.transpose()
+    for _ in range(ITERATIONS):
+        _solve(items, matrix.indptr, matrix.indices, users)
+        _solve(users, item_indptr, item_indices, items)
+    return users, items
+
+
+def recommend(matrix, users, items, count):
+    """(user_id, id рецептов) с наибольшими оценками для каждого
+    пользователя; уже отмеченные пропускаются. Оценки считаются
+    пачками пользователей не больше SCORE_BATCH_CELLS за раз."""
+    batch_size = max(1, SCORE_BATCH_CELLS // max(len(matrix.item_ids), 1))
+    for start in range(0, len(matrix.user_ids), batch_size):
+        scores = users[start:start + batch_size] @ items.T
+        for offset, row_scores in enumerate(scores):
+            index = start + offset
+            row_scores[matrix.row(index)] = -np.inf
+            size = min(count, len(row_scores))
+            best = np.argpartition(-row_scores, size - 1)[:size]
+            best = best[np.argsort(-row_scores[best], kind='stable')]
+            best = best[row_scores[best] > 0]
+            yield matrix.user_ids[index], matrix.item_ids[best].tolist()
+
+
+def build():
+    """Пересчитывает рекомендации всех пользователей: матрица отметок
+    из избранного и корзин раскладывается ALS, каждому пользователю
+    сохраняются рецепты с наибольшими оценками. Строки записываются
+    пачками; рекомендации пользователей, у которых больше нет
+    отметок, удаляются. Возвращает число пользователей
+    с рекомендациями."""
+    started = timezone.now()
+    matrix = InteractionMatrix.load()
+    written = 0
+    if len(matrix.item_ids):
+        users, items = factorize(matrix)
+        count = settings.RECOMMENDED_RECIPES_COUNT
+        batch = []
+        for user_id, recipe_ids in recommend(matrix, users, items, count):
+            if recipe_ids:
+                batch.append(Recommendation(
+                    user_id=int(user_id), recipe_ids=recipe_ids,
+                    updated_at=started
+                ))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                written += _write(batch)
+                batch = []
+        written += _write(batch)
+    Recommendation.objects.filter(updated_at__lt=started).delete()
+    return written
+
+
+def _write(batch):
+    Recommendation.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['recipe_ids', 'updated_at'],
+    )
+    return len(batch)
@@ -0,0 +1,261 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .cache import get_catalog_version, get_recipe_names_version
+
+
+def normalize_name(value):
+    """Приводит название к виду для поиска: без регистра, ё → е."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Отсортированный по нормализованному названию массив ингредиентов.
+    Поиск по префиксу — бинарный поиск границы и проход вперёд,
+    по подстроке — по спискам позиций триграмм."""
+    # Запросы короче триграммы ищутся только по началу названия
+    trigram_size = 3
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[0], row[1]['id']))
+        self.keys = [key for key, _ in rows]
+        self.items = [item for _, item in rows]
+        self.trigrams = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            for trigram in self.split_trigrams(key):
+                self.trigrams[trigram].append(position)
+
+    @classmethod
+    def split_trigrams(cls, value):
+        size = cls.trigram_size
+        return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+    @classmethod
+    def build(cls):
+        from .models import Ingredient
+        rows = Ingredient.objects.values_list(
+            'search_name', 'id', 'name', 'measurement_unit'
+        )
+        return cls(
+            (search_name, {
+                'id': pk, 'name': name, 'measurement_unit': unit
+            })
+            for search_name, pk, name, unit in rows.iterator()
+        )
+
+    def startswith(self, prefix, limit=None):
+        prefix = normalize_name(prefix)
+        result = []
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys):
+            if not self.keys[position].startswith(prefix):
+                break
+            result.append(self.items[position])
+            if limit is not None and len(result) >= limit:
+                break
+            position += 1
+        return result
+
+    def autocomplete(self, query, limit):
+        """Не более limit ингредиентов: сначала совпадения по началу
+        названия, затем по вхождению подстроки. Кандидаты на вхождение
+        берутся из самого короткого списка позиций триграмм запроса."""
+        query = normalize_name(query)
+        result = self.startswith(query, limit)
+        if len(result) >= limit or len(query) < self.trigram_size:
+            return result
+        positions = min(
+            (self.trigrams.get(trigram, ())
+             for trigram in self.split_trigrams(query)),
+            key=len
+        )
+        for position in positions:
+            key = self.keys[position]
+            if query in key and not key.startswith(query):
+                result.append(self.items[position])
+                if len(result) >= limit:
+                    break
+        return result
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """Индекс ингредиентов текущего процесса; перестраивается, когда
+    версия справочников в кэше изменилась (recipes.signals)."""
+    global _index, _index_version
+    version = get_catalog_version()
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = IngredientIndex.build()
+                _index_version = version
+    return _index
+
+
+class RecipeNameIndex:
+    """Подсказки по названиям рецептов в памяти процесса.
+    Ключи (нормализованное название с начала каждого слова, id)
+    лежат в отсортированном списке, поэтому префикс находится
+    бинарным поиском. Вес подсказки — число добавлений в избранное."""
+    # Сколько последних ответов хранить до следующего изменения индекса
+    memo_size = 1024
+    # Запас при догоняющей синхронизации на транзакции, которые
+    # зафиксировались позже, чем был записан updated_at
+    sync_overlap = timedelta(seconds=5)
+    _word = re.compile(r'\w+')
+
+    def __init__(self, version=None):
+        self.keys = []
+        self.recipes = {}
+        self.memo = {}
+        self.lock = threading.Lock()
+        self.version = version
+        self.built_at = time.monotonic()
+        self.synced_at = timezone.now() - self.sync_overlap
+
+    @classmethod
+    def word_keys(cls, recipe_id, name):
+        normalized = normalize_name(name)
+        return [
+            (normalized[word.start():], recipe_id)
+            for word in cls._word.finditer(normalized)
+        ]
+
+    @classmethod
+    def build(cls, version=None):
+        from .models import Recipe
+        index = cls(version)
+        rows = Recipe.objects.values_list('id', 'name', 'favorites_count')
+        for recipe_id, name, weight in rows.iterator():
+            keys = cls.word_keys(recipe_id, name)
+            index.keys.extend(keys)
+            index.recipes[recipe_id] = (name, weight, keys)
+        index.keys.sort()
+        return index
+
+    def _remove(self, recipe_id):
+        entry = self.recipes.pop(recipe_id, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            position = bisect_left(self.keys, key)
+            if position < len(self.keys) and self.keys[position] == key:
+                del self.keys[position]
+
+    def put(self, recipe_id, name, weight):
+        keys = self.word_keys(recipe_id, name)
+        with self.lock:
+            self._remove(recipe_id)
+            for key in keys:
+                insort(self.keys, key)
+            self.recipes[recipe_id] = (name, weight, keys)
+            self.memo.clear()
+
+    def remove(self, recipe_id):
+        with self.lock:
+            self._remove(recipe_id)
+            self.memo.clear()
+
+    def sync(self, version):
+        """Догоняет изменения других процессов по updated_at.
+        Возвращает False, если рецепты удалялись и индекс нужно
+        перестроить целиком."""
+        from .models import Recipe
+        since, self.synced_at = (
+            self.synced_at, timezone.now() - self.sync_overlap
+        )
+        rows = Recipe.objects.filter(updated_at__gte=since).values_list(
+            'id', 'name', 'favorites_count'
+        )
+        for recipe_id, name, weight in rows:
+            self.put(recipe_id, name, weight)
+        self.version = version
+        return Recipe.objects.count() == len(self.recipes)
+
+    def suggest(self, query, limit):
+        """Не более limit рецептов, в названии которых есть слово,
+        начинающееся с query; популярные первыми."""
+        prefix = normalize_name(query)
+        result = self.memo.get((prefix, limit))
+        if result is not None:
+            return result
+        with self.lock:
+            low = bisect_left(self.keys, (prefix,))
+            high = bisect_left(self.keys, (prefix + '\U0010ffff',))
+            recipe_ids = {self.keys[i][1] for i in range(low, high)}
+            best = heapq.nlargest(
+                limit, recipe_ids,
+                key=lambda recipe_id: (self.recipes[recipe_id][1], recipe_id)
+            )
+            result = [
+                {'id': recipe_id, 'name': self.recipes[recipe_id][0]}
+                for recipe_id in best
+            ]
+            if len(self.memo) >= self.memo_size:
+                self.memo.clear()
+            self.memo[(prefix, limit)] = result
+        return result
+
+
+_recipe_names = None
+_recipe_names_lock = threading.Lock()
+
+
+def get_recipe_name_index():
+    """Индекс подсказок текущего процесса. Изменения других процессов
+    подтягиваются при смене версии в кэше; раз в
+    RECIPE_SUGGEST_REBUILD_INTERVAL индекс перестраивается целиком,
+    чтобы обновить веса."""
+    global _recipe_names
+    version = get_recipe_names_version()
+    index = _recipe_names
+    if not _expired(index) and index.version == version:
+        return index
+    with _recipe_names_lock:
+        index = _recipe_names
+        if _expired(index):
+            _recipe_names = RecipeNameIndex.build(version)
+        elif index.version != version and not index.sync(version):
+            _recipe_names = RecipeNameIndex.build(version)
+    return _recipe_names
+
+
+def _expired(index):
+    return index is None or (
+        time.monotonic() - index.built_at
+        > settings.RECIPE_SUGGEST_REBUILD_INTERVAL
+    )
+
+
+def recipe_name_changed(recipe):
+    """Сразу обновляет индекс этого процесса (вызывается сигналом)."""
+    if _recipe_names is not None:
+        _recipe_names.put(recipe.pk, recipe.name, recipe.favorites_count)
+
+
+def recipe_removed(recipe_id):
+    if _recipe_names is not None:
+        _recipe_names.remove(recipe_id)
+
+
+def warm_up():
+    """Строит индексы при старте воркера, а не на первом запросе."""
+    try:
+        get_recipe_name_index()
+        get_ingredient_index()
+    except DatabaseError:
+        # База ещё не создана (до migrate)
+        pass
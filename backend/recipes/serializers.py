@@ -1,3 +1,5 @@
+from collections import Counter
+
 from rest_framework import serializers
 from django.core.validators import MinValueValidator
 from .models import (
@@ -6,6 +8,7 @@
     ShoppingCart, Subscription
 )
 from users.serializers import UserSerializer
+from .services import save_recipe
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -31,6 +34,55 @@ class Meta:
         model = RecipeIngredient
         fields = ['id', 'name', 'measurement_unit', 'amount']
 
+class IngredientAmountSerializer(serializers.Serializer):
+    """Ингредиент в запросе на запись рецепта. id проверяется
+    списком в RecipeCreateUpdateSerializer, а не по одному."""
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField(validators=[MinValueValidator(1)])
+
+
+def get_objects_in_bulk(model, ids, label):
+    """Возвращает {id: объект} одним запросом in_bulk. Повторы
+    и все отсутствующие id перечисляются в одной ошибке."""
+    duplicates = sorted(
+        pk for pk, count in Counter(ids).items() if count > 1
+    )
+    if duplicates:
+        raise serializers.ValidationError(
+            f'{label} повторяются: {", ".join(map(str, duplicates))}.'
+        )
+    objects = model.objects.in_bulk(ids)
+    missing = [pk for pk in ids if pk not in objects]
+    if missing:
+        raise serializers.ValidationError(
+            f'{label} не найдены: {", ".join(map(str, missing))}.'
+        )
+    return objects
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций с избранным и корзиной."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=100
+    )
+
+    def validate_recipes(self, value):
+        # Повторы отбрасываются, порядок сохраняется
+        return list(dict.fromkeys(value))
+
+
+class PantrySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся продуктам
+    (?ingredients=1&ingredients=2&tags=breakfast&max_cooking_time=30)."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=50
+    )
+    tags = serializers.ListField(
+        child=serializers.CharField(), required=False, default=list
+    )
+    max_cooking_time = serializers.IntegerField(min_value=1, required=False)
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
@@ -51,7 +103,16 @@ class Meta:
         ]
         read_only_fields = ['id', 'author']
 
+    def to_representation(self, instance):
+        # Подписка на автора посчитана в queryset (RecipeQuerySet.for_read)
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        # Флаг уже посчитан в queryset (RecipeQuerySet.with_user_flags)
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Favorite.objects.filter(
@@ -60,6 +121,8 @@ def get_is_favorited(self, obj):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return ShoppingCart.objects.filter(
@@ -67,11 +130,27 @@ def get_is_in_shopping_cart(self, obj):
             ).exists()
         return False
 
-class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
-    ingredients = RecipeIngredientSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
+class RecipeShortSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Recipe
+        fields = ['id', 'name', 'image', 'cooking_time']
+
+
+class SubscriptionSerializer(UserSerializer):
+    """Автор в списке подписок. latest_recipes подготавливает
+    UserViewSet.subscriptions."""
+    recipes = RecipeShortSerializer(
+        source='latest_recipes', many=True, read_only=True
     )
+    recipes_count = serializers.IntegerField(read_only=True)
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ['recipes', 'recipes_count']
+
+
+class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
+    ingredients = IngredientAmountSerializer(many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = serializers.ImageField()
 
     class Meta:
@@ -81,21 +160,30 @@ class Meta:
             'ingredients', 'tags', 'cooking_time'
         ]
 
+    def validate_ingredients(self, value):
+        get_objects_in_bulk(
+            Ingredient, [item['id'] for item in value], 'Ингредиенты'
+        )
+        return value
+
+    def validate_tags(self, value):
+        tags = get_objects_in_bulk(Tag, value, 'Теги')
+        return [tags[pk] for pk in value]
+
+    @staticmethod
+    def get_amounts(ingredients_data):
+        return {item['id']: item['amount'] for item in ingredients_data}
+
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
-        recipe = Recipe.objects.create(
+        recipe = Recipe(
             author=self.context['request'].user,
             **validated_data
         )
-        recipe.tags.set(tags_data)
-        for ingredient_data in ingredients_data:
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient=ingredient_data['id'],
-                amount=ingredient_data['amount']
-            )
-        return recipe
+        return save_recipe(
+            recipe, tags_data, self.get_amounts(ingredients_data)
+        )
 
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
@@ -103,17 +191,12 @@ def update(self, instance, validated_data):
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
-
-        if tags_data is not None:
-            instance.tags.set(tags_data)
 
+        amounts = None
         if ingredients_data is not None:
-            instance.recipe_ingredients.all().delete()
-            for ingredient_data in ingredients_data:
-                RecipeIngredient.objects.create(
-                    recipe=instance,
-                    ingredient=ingredient_data['id'],
-                    amount=ingredient_data['amount']
-                )
-        return instance
\ No newline at end of file
+            amounts = self.get_amounts(ingredients_data)
+        return save_recipe(instance, tags_data, amounts)
+
+    def to_representation(self, instance):
+        # Ответ на запись совпадает с ответом на чтение
+        return RecipeSerializer(instance, context=self.context).data
@@ -0,0 +1,173 @@
+from django.db import connection, transaction
+
+from . import counters, feed, shopping_list, similar
+from .cache import invalidate_counts, invalidate_pantry, invalidate_recipes
+from .models import Favorite, RecipeIngredient, ShoppingCart, Subscription
+
+
+def set_recipe_ingredients(recipe, amounts):
+    """Приводит ингредиенты рецепта к {ingredient_id: amount}: обновляет
+    изменившиеся количества, добавляет новые и удаляет лишние строки
+    пакетными запросами, не пересоздавая остальные."""
+    existing = {
+        item.ingredient_id: item
+        for item in RecipeIngredient.objects.filter(recipe=recipe)
+    }
+    to_create, to_update, deltas = [], [], {}
+    for ingredient_id, amount in amounts.items():
+        item = existing.pop(ingredient_id, None)
+        if item is None:
+            to_create.append(RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            ))
+            deltas[ingredient_id] = amount
+        elif item.amount != amount:
+            deltas[ingredient_id] = amount - item.amount
+            item.amount = amount
+            to_update.append(item)
+
+    # bulk-операции не отправляют сигналы: списки покупок и кэш ответа
+    # обновляются явно, удаление учитывается сигналом в том же пакете
+    with transaction.atomic(), shopping_list.collect_changes():
+        if existing:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in existing.values()]
+            ).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+            # Удаление строк ставит пересчёт похожих и сбрасывает
+            # индекс подбора по продуктам сигналами
+            similar.schedule_refresh(recipe.pk)
+            invalidate_pantry()
+        shopping_list.recipe_ingredients_changed(recipe.pk, deltas)
+    invalidate_recipes([recipe.pk])
+
+
+def save_recipe(recipe, tags=None, ingredients=None):
+    """Сохраняет рецепт с тегами и ингредиентами
+    ({ingredient_id: amount}) в одной транзакции."""
+    with transaction.atomic():
+        recipe.save()
+        if tags is not None:
+            recipe.tags.set(tags)
+        if ingredients is not None:
+            set_recipe_ingredients(recipe, ingredients)
+    return recipe
+
+
+def add_relations(model, user, field, target_ids):
+    """Связывает пользователя с объектами target_ids (избранное,
+    корзина, подписки) одним INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    Уже существующие связи и несуществующие объекты пропускаются.
+    Возвращает множество id, для которых связь добавлена.
+
+    Сигналы post_save при этом не отправляются."""
+    if not target_ids:
+        return set()
+    qn = connection.ops.quote_name
+    opts = model._meta
+    user_column = opts.get_field('user').column
+    target_field = opts.get_field(field)
+    target_opts = target_field.related_model._meta
+    target_pk = qn(target_opts.pk.column)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'INSERT INTO {qn(opts.db_table)} '
+        f'({qn(user_column)}, {qn(target_field.column)}) '
+        f'SELECT %s, {target_pk} FROM {qn(target_opts.db_table)} '
+        f'WHERE {target_pk} IN ({placeholders}) '
+        f'ON CONFLICT DO NOTHING RETURNING {qn(target_field.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.pk, *target_ids])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def remove_relations(model, user, field, target_ids=None):
+    """Удаляет связи пользователя с target_ids (все связи, если None)
+    одним DELETE ... RETURNING. Возвращает множество id, для которых
+    связь удалена.
+
+    Сигналы post_delete при этом не отправляются."""
+    qn = connection.ops.quote_name
+    opts = model._meta
+    target_column = qn(opts.get_field(field).column)
+    sql = (
+        f'DELETE FROM {qn(opts.db_table)} '
+        f'WHERE {qn(opts.get_field("user").column)} = %s'
+    )
+    params = [user.pk]
+    if target_ids is not None:
+        if not target_ids:
+            return set()
+        placeholders = ', '.join(['%s'] * len(target_ids))
+        sql += f' AND {target_column} IN ({placeholders})'
+        params.extend(target_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {target_column}', params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def add_to_favorites(user, recipe_ids):
+    with transaction.atomic():
+        added = add_relations(Favorite, user, 'recipe', recipe_ids)
+        counters.favorites_changed(added, 1)
+    if added:
+        invalidate_counts([user.pk])
+    return added
+
+
+def remove_from_favorites(user, recipe_ids):
+    with transaction.atomic():
+        removed = remove_relations(Favorite, user, 'recipe', recipe_ids)
+        counters.favorites_changed(removed, -1)
+    if removed:
+        invalidate_counts([user.pk])
+    return removed
+
+
+def add_to_shopping_cart(user, recipe_ids):
+    with transaction.atomic():
+        added = add_relations(ShoppingCart, user, 'recipe', recipe_ids)
+        if added:
+            shopping_list.recipes_added(user.pk, added)
+            counters.carts_changed(added, 1)
+    if added:
+        invalidate_counts([user.pk])
+    return added
+
+
+def remove_from_shopping_cart(user, recipe_ids=None):
+    """Убирает рецепты из корзины; None — очищает корзину целиком."""
+    with transaction.atomic():
+        removed = remove_relations(ShoppingCart, user, 'recipe', recipe_ids)
+        if recipe_ids is None:
+            shopping_list.clear(user.pk)
+        elif removed:
+            shopping_list.recipes_removed(user.pk, removed)
+        counters.carts_changed(removed, -1)
+    if removed:
+        invalidate_counts([user.pk])
+    return removed
+
+
+def follow_author(user, author_id):
+    """Подписка с заполнением ленты. Возвращает False, если подписка
+    уже была или автора нет."""
+    with transaction.atomic():
+        added = add_relations(Subscription, user, 'author', [author_id])
+        if added:
+            feed.author_followed(user.pk, author_id)
+            counters.subscribers_changed(added, 1)
+    return bool(added)
+
+
+def unfollow_author(user, author_id):
+    with transaction.atomic():
+        removed = remove_relations(Subscription, user, 'author', [author_id])
+        if removed:
+            feed.author_unfollowed(user.pk, author_id)
+            counters.subscribers_changed(removed, -1)
+    return bool(removed)
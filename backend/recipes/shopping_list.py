@@ -0,0 +1,150 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, When
+from django.db.models.functions import Greatest
+
+from .cache import invalidate_shopping_lists
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+REBUILD_BATCH_SIZE = 1000
+
+_pending = threading.local()
+
+
+def apply_deltas(deltas):
+    """Применяет изменения {(user_id, ingredient_id): delta} к списку
+    покупок фиксированным числом запросов. Недостающие позиции
+    вставляются с ON CONFLICT DO NOTHING, затем количество меняется
+    одним UPDATE amount = amount + delta, поэтому параллельные
+    изменения одной позиции не теряются и не нарушают уникальность."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = {user_id for user_id, _ in deltas}
+    ingredient_ids = {ingredient_id for _, ingredient_id in deltas}
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=ingredient_ids
+    )
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=0
+                )
+                for (user_id, ingredient_id), delta in deltas.items()
+                if delta > 0
+            ],
+            ignore_conflicts=True
+        )
+        items.update(amount=Greatest(
+            Case(
+                *(
+                    When(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        then=F('amount') + delta
+                    )
+                    for (user_id, ingredient_id), delta in deltas.items()
+                ),
+                default=F('amount'),
+                output_field=IntegerField()
+            ),
+            0
+        ))
+        if any(delta < 0 for delta in deltas.values()):
+            items.filter(amount=0).delete()
+    invalidate_shopping_lists(user_ids)
+
+
+def recipes_added(user_id, recipe_ids, sign=1):
+    """Рецепты добавлены в корзину пользователя (sign=-1 — удалены)."""
+    deltas = defaultdict(int)
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('ingredient_id', 'amount')
+    for ingredient_id, amount in rows:
+        deltas[(user_id, ingredient_id)] += sign * amount
+    apply_deltas(deltas)
+
+
+def recipes_removed(user_id, recipe_ids):
+    recipes_added(user_id, recipe_ids, sign=-1)
+
+
+def clear(user_id):
+    """Корзина пользователя очищена целиком."""
+    ShoppingListItem.objects.filter(user_id=user_id).delete()
+    invalidate_shopping_lists([user_id])
+
+
+@contextmanager
+def collect_changes():
+    """Накапливает изменения ингредиентов рецептов (в том числе из
+    сигналов) и переносит их в списки покупок одним пакетом на выходе."""
+    if getattr(_pending, 'deltas', None) is not None:
+        yield
+        return
+    _pending.deltas = defaultdict(lambda: defaultdict(int))
+    try:
+        yield
+        collected = _pending.deltas
+    finally:
+        _pending.deltas = None
+    for recipe_id, amount_deltas in collected.items():
+        recipe_ingredients_changed(recipe_id, amount_deltas)
+
+
+def recipe_ingredients_changed(recipe_id, amount_deltas):
+    """Ингредиенты рецепта изменились на {ingredient_id: delta};
+    изменение переносится в списки всех, у кого рецепт в корзине."""
+    pending = getattr(_pending, 'deltas', None)
+    if pending is not None:
+        for ingredient_id, delta in amount_deltas.items():
+            pending[recipe_id][ingredient_id] += delta
+        return
+    amount_deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in amount_deltas.items() if delta
+    }
+    if not amount_deltas:
+        return
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True)
+    apply_deltas({
+        (user_id, ingredient_id): delta
+        for user_id in user_ids
+        for ingredient_id, delta in amount_deltas.items()
+    })
+
+
+def rebuild(user_ids=None):
+    """Пересобирает списки покупок из корзин. Возвращает число позиций."""
+    # Условия на корзину задаются одним filter(): отдельные вызовы
+    # по многозначной связи дают два JOIN и умножают суммы
+    cart_filter = {'recipe__in_shopping_cart__isnull': False}
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        cart_filter = {'recipe__in_shopping_cart__user_id__in': user_ids}
+        items = items.filter(user_id__in=user_ids)
+    totals = RecipeIngredient.objects.filter(**cart_filter).values_list(
+        'recipe__in_shopping_cart__user_id', 'ingredient_id'
+    ).annotate(total=Sum('amount')).order_by()
+    created = 0
+    with transaction.atomic():
+        items.delete()
+        batch = []
+        for user_id, ingredient_id, total in totals.iterator():
+            batch.append(ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=total
+            ))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                ShoppingListItem.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        ShoppingListItem.objects.bulk_create(batch)
+        created += len(batch)
+    invalidate_shopping_lists(user_ids)
+    return created
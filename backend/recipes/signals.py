@@ -0,0 +1,255 @@
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from users.models import User
+
+from . import counters, feed, fulltext, search, shopping_list, similar
+from .cache import (
+    invalidate_catalog, invalidate_counts, invalidate_pantry,
+    invalidate_recipe_names, invalidate_recipes
+)
+from .models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    Subscription, Tag
+)
+from .search import normalize_name
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_counts(sender, **kwargs):
+    """Сбрасывает закэшированные количества рецептов в списках."""
+    invalidate_counts()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_user_recipe_counts(sender, instance, **kwargs):
+    """Избранное и корзина меняют только количества с фильтрами
+    is_favorited / is_in_shopping_cart их владельца."""
+    invalidate_counts([instance.user_id])
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_cooking_time(sender, instance, raw, update_fields, **kwargs):
+    """Запоминает прежнее время приготовления: от него зависит индекс
+    подбора по продуктам, от названия и описания — нет."""
+    instance._previous_cooking_time = None
+    if not instance.pk or raw:
+        return
+    if update_fields is not None and 'cooking_time' not in update_fields:
+        return
+    instance._previous_cooking_time = Recipe.objects.filter(
+        pk=instance.pk
+    ).values_list('cooking_time', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_pantry_on_recipe_save(sender, instance, created, raw,
+                                     **kwargs):
+    previous = getattr(instance, '_previous_cooking_time', None)
+    if created or raw or (
+        previous is not None and previous != instance.cooking_time
+    ):
+        invalidate_pantry()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def invalidate_pantry_on_ingredient_save(sender, instance, created, raw,
+                                         **kwargs):
+    # Индекс хранит только состав рецепта, не количества
+    previous = getattr(instance, '_previous', None)
+    if created or raw or previous and previous[0] != instance.ingredient_id:
+        invalidate_pantry()
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_pantry_index(sender, **kwargs):
+    """Индексы подбора по продуктам перестраиваются при следующем
+    запросе."""
+    invalidate_pantry()
+
+
+@receiver(pre_save, sender=Ingredient)
+def fill_ingredient_search_name(sender, instance, **kwargs):
+    """Синхронизирует search_name с name, в том числе для loaddata."""
+    instance.search_name = normalize_name(instance.name)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_catalog_version(sender, **kwargs):
+    """Новая версия справочников: сбрасывает ETag, кэш ответов
+    и индекс ингредиентов."""
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_payload(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredients_payload(sender, instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_payload(sender, instance, action, reverse,
+                                   pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_recipes([instance.pk])
+    elif pk_set:
+        invalidate_recipes(pk_set)
+    else:
+        # post_clear со стороны тега: pk_set не передаётся
+        invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_payload(sender, instance, created, update_fields,
+                              **kwargs):
+    """Профиль автора входит в ответ рецепта."""
+    if created:
+        return
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def increment_counters(sender, instance, created, **kwargs):
+    if created:
+        update_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Recipe)
+def decrement_counters(sender, instance, **kwargs):
+    update_counters(sender, instance, -1)
+
+
+def update_counters(sender, instance, delta):
+    """Счётчики популярности (recipes.counters) для связи instance."""
+    if sender is Favorite:
+        counters.favorites_changed([instance.recipe_id], delta)
+    elif sender is ShoppingCart:
+        counters.carts_changed([instance.recipe_id], delta)
+    elif sender is Subscription:
+        counters.subscribers_changed([instance.author_id], delta)
+    else:
+        counters.recipes_changed([instance.author_id], delta)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe_text(sender, instance, update_fields, **kwargs):
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    fulltext.index_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe_text(sender, instance, **kwargs):
+    fulltext.unindex_recipe(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_names(sender, instance, **kwargs):
+    search.recipe_name_changed(instance)
+    invalidate_recipe_names()
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_name(sender, instance, **kwargs):
+    search.recipe_removed(instance.pk)
+    invalidate_recipe_names()
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def fill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.author_followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_feed(sender, instance, **kwargs):
+    feed.author_unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        shopping_list.recipes_added(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    shopping_list.recipes_removed(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(sender, instance, raw, **kwargs):
+    """Запоминает прежние ингредиент и количество для расчёта разницы."""
+    instance._previous = None
+    if instance.pk and not raw:
+        instance._previous = RecipeIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list('ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def update_shopping_lists_on_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    deltas = {instance.ingredient_id: instance.amount}
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        ingredient_id, amount = previous
+        deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+    shopping_list.recipe_ingredients_changed(instance.recipe_id, deltas)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def update_shopping_lists_on_delete(sender, instance, **kwargs):
+    shopping_list.recipe_ingredients_changed(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def update_similar_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    # Сходство зависит только от набора ингредиентов, не от количеств
+    previous = getattr(instance, '_previous', None)
+    if created or previous and previous[0] != instance.ingredient_id:
+        similar.schedule_refresh(instance.recipe_id)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def update_similar_on_delete(sender, instance, **kwargs):
+    similar.schedule_refresh(instance.recipe_id)
@@ -0,0 +1,202 @@
+import heapq
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import RecipeIngredient, SimilarRecipe, SimilarRecipeRefresh
+
+REBUILD_BATCH_SIZE = 1000
+REFRESH_BATCH_SIZE = 100
+
+
+class IngredientMatrix:
+    """Разреженная матрица рецепт × ингредиент: строки (ингредиенты
+    рецепта) и инвертированный индекс (рецепты с ингредиентом).
+    Id хранятся в компактных массивах array. Ингредиенты из common
+    (есть почти в каждом рецепте, как соль) не дают общих рецептов,
+    но учитываются в размере строки."""
+
+    def __init__(self):
+        self.rows = defaultdict(lambda: array('q'))
+        self.postings = defaultdict(lambda: array('q'))
+        self.common = set()
+
+    @classmethod
+    def load(cls, queryset):
+        matrix = cls()
+        rows = queryset.values_list('recipe_id', 'ingredient_id').order_by()
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=10000):
+            matrix.rows[recipe_id].append(ingredient_id)
+            matrix.postings[ingredient_id].append(recipe_id)
+        return matrix
+
+    def scores(self, recipe_id):
+        """{id: мера Жаккара} для рецептов с общими ингредиентами.
+        Число общих ингредиентов считается только по спискам
+        инвертированного индекса, а не по всем рецептам."""
+        ingredients = self.rows.get(recipe_id, ())
+        shared = Counter()
+        for ingredient_id in ingredients:
+            if ingredient_id not in self.common:
+                shared.update(self.postings[ingredient_id])
+        shared.pop(recipe_id, None)
+        size = len(ingredients)
+        return {
+            other: count / (size + len(self.rows[other]) - count)
+            for other, count in shared.items()
+        }
+
+
+def top(scores, count):
+    """count самых похожих: [(id, score)], при равенстве новее первыми."""
+    return heapq.nlargest(
+        count, scores.items(), key=lambda item: (item[1], item[0])
+    )
+
+
+def get_similar_ids(recipe_id, limit):
+    """id похожих рецептов, самые похожие первыми."""
+    return list(
+        SimilarRecipe.objects.filter(recipe_id=recipe_id)
+        .order_by('-score', '-similar_id')
+        .values_list('similar_id', flat=True)[:limit]
+    )
+
+
+def rebuild():
+    """Пересчитывает списки похожих для всех рецептов.
+    Возвращает число строк."""
+    matrix = IngredientMatrix.load(RecipeIngredient.objects.all())
+    matrix.common = {
+        ingredient_id for ingredient_id, recipe_ids in matrix.postings.items()
+        if len(recipe_ids) > settings.SIMILAR_RECIPES_MAX_POSTINGS
+    }
+    count = settings.SIMILAR_RECIPES_COUNT
+    created = 0
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        batch = []
+        for recipe_id in matrix.rows:
+            batch.extend(
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id, score=score
+                )
+                for similar_id, score in top(matrix.scores(recipe_id), count)
+            )
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                SimilarRecipe.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        SimilarRecipe.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def refresh(recipe_ids):
+    """Пересчитывает списки рецептов recipe_ids, у которых изменился
+    состав, и обновляет их место в списках рецептов с общими
+    ингредиентами. Читаются только эти рецепты (не больше
+    SIMILAR_RECIPES_MAX_POSTINGS на ингредиент); списки, из которых
+    рецепт выбыл, остаются короче до rebuild_similar_recipes."""
+    recipe_ids = set(recipe_ids)
+    postings = RecipeIngredient.objects.filter(
+        ingredient_id__in=RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id')
+    ).values('ingredient_id').annotate(
+        recipes=Count('id')
+    ).order_by().values_list('ingredient_id', 'recipes')
+    common = set()
+    for ingredient_id, recipes in postings:
+        if recipes > settings.SIMILAR_RECIPES_MAX_POSTINGS:
+            common.add(ingredient_id)
+    related = RecipeIngredient.objects.filter(
+        Q(recipe_id__in=recipe_ids)
+        | Q(ingredient_id__in=RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).exclude(ingredient_id__in=common).values('ingredient_id'))
+    ).values('recipe_id')
+    matrix = IngredientMatrix.load(
+        RecipeIngredient.objects.filter(recipe_id__in=related)
+    )
+    matrix.common = common
+    count = settings.SIMILAR_RECIPES_COUNT
+
+    # Списки целиком: рецептов с общими ингредиентами и тех,
+    # в которых изменённые рецепты уже есть
+    current = defaultdict(dict)
+    rows = SimilarRecipe.objects.filter(
+        Q(recipe_id__in=related)
+        | Q(recipe_id__in=SimilarRecipe.objects.filter(
+            similar_id__in=recipe_ids
+        ).values('recipe_id'))
+    ).values_list('recipe_id', 'similar_id', 'score')
+    for recipe_id, similar_id, score in rows:
+        current[recipe_id][similar_id] = score
+
+    # Сходство симметрично: оценки изменённых рецептов дают и их
+    # новое место в чужих списках
+    changed = {}
+    incoming = defaultdict(dict)
+    for recipe_id in recipe_ids:
+        scores = matrix.scores(recipe_id)
+        changed[recipe_id] = top(scores, count)
+        for other_id, score in scores.items():
+            incoming[other_id][recipe_id] = score
+    for other_id in current.keys() | incoming.keys():
+        if other_id in recipe_ids:
+            continue
+        scores = {
+            similar_id: score
+            for similar_id, score in current[other_id].items()
+            if similar_id not in recipe_ids
+        }
+        scores.update(incoming[other_id])
+        new = top(scores, count)
+        if dict(new) != current[other_id]:
+            changed[other_id] = new
+
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=changed).delete()
+        SimilarRecipe.objects.bulk_create(
+            [
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id, score=score
+                )
+                for recipe_id, similar in changed.items()
+                for similar_id, score in similar
+            ],
+            ignore_conflicts=True
+        )
+
+
+def schedule_refresh(recipe_id):
+    """Ставит рецепт в очередь пересчёта похожих в транзакции
+    изменения. Очередь разбирает refresh_pending() вне запроса
+    (rebuild_similar_recipes --pending)."""
+    SimilarRecipeRefresh.objects.bulk_create(
+        [SimilarRecipeRefresh(recipe_id=recipe_id)], ignore_conflicts=True
+    )
+
+
+def refresh_pending():
+    """Пересчитывает рецепты из очереди пачками по REFRESH_BATCH_SIZE.
+    Возвращает их число."""
+    refreshed = 0
+    while True:
+        recipe_ids = list(
+            SimilarRecipeRefresh.objects.values_list(
+                'recipe_id', flat=True
+            )[:REFRESH_BATCH_SIZE]
+        )
+        if not recipe_ids:
+            return refreshed
+        with transaction.atomic():
+            SimilarRecipeRefresh.objects.filter(
+                recipe_id__in=recipe_ids
+            ).delete()
+            refresh(recipe_ids)
+        refreshed += len(recipe_ids)
@@ -0,0 +1,38 @@
+"""Общие данные для тестов рецептов (tests_*.py)."""
+from django.contrib.auth import get_user_model
+
+from .models import Ingredient, Recipe, Tag
+from .services import set_recipe_ingredients
+
+User = get_user_model()
+
+
+def create_user(username='testuser'):
+    return User.objects.create_user(
+        email=f'{username}@example.com',
+        username=username,
+        password='testpass123'
+    )
+
+
+def create_ingredients(count):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+        for i in range(count)
+    )
+
+
+def create_tag(slug='breakfast', name='Завтрак'):
+    return Tag.objects.create(name=name, color='#FF5733', slug=slug)
+
+
+def create_recipe(author, name='Рецепт', ingredients=None, tags=(),
+                  **fields):
+    """Рецепт с ингредиентами {ingredient_id: amount} и тегами."""
+    fields = {'text': 'Описание', 'cooking_time': 10, **fields}
+    recipe = Recipe.objects.create(name=name, author=author, **fields)
+    if tags:
+        recipe.tags.add(*tags)
+    if ingredients:
+        set_recipe_ingredients(recipe, ingredients)
+    return recipe
@@ -0,0 +1,122 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from recipes.filters import IngredientFilter
+from recipes.models import Ingredient, Tag
+from recipes.testing import create_tag
+
+
+class IngredientSearchTest(APITestCase):
+    """Поиск ингредиентов по нормализованному префиксу"""
+
+    def setUp(self):
+        for name in ['Картофель', 'Ёжевика', 'Морковь']:
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def get_names(self, query):
+        response = self.client.get('/api/ingredients/', {'name': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.data]
+
+    def test_search_name_filled(self):
+        self.assertEqual(
+            Ingredient.objects.get(name='Ёжевика').search_name, 'ежевика'
+        )
+
+    def test_case_insensitive_cyrillic(self):
+        self.assertEqual(self.get_names('карт'), ['Картофель'])
+        self.assertEqual(self.get_names('КАРТ'), ['Картофель'])
+
+    def test_yo_equals_ye(self):
+        self.assertEqual(self.get_names('еж'), ['Ёжевика'])
+        self.assertEqual(self.get_names('ёж'), ['Ёжевика'])
+
+    def test_index_refreshed_on_save(self):
+        self.assertEqual(self.get_names('кап'), [])
+        Ingredient.objects.create(name='Капуста', measurement_unit='г')
+        self.assertEqual(self.get_names('кап'), ['Капуста'])
+
+    def test_index_lookup_without_queries(self):
+        self.get_names('мор')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_names('мор'), ['Морковь'])
+
+    def test_filter_uses_search_name(self):
+        queryset = IngredientFilter(
+            {'name': 'МОРК'}, queryset=Ingredient.objects.all()
+        ).qs
+        self.assertEqual([i.name for i in queryset], ['Морковь'])
+
+
+class IngredientAutocompleteTest(APITestCase):
+    """Автодополнение ингредиентов: ограниченный ранжированный список"""
+
+    url = '/api/ingredients/autocomplete/'
+
+    def setUp(self):
+        for name in ['Сахарная пудра', 'Сахар', 'Ванильный сахар', 'Соль']:
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def test_prefix_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prefix_ranked_above_substring(self):
+        response = self.client.get(self.url, {'name': 'сахар'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['name'] for item in response.data],
+            ['Сахар', 'Сахарная пудра', 'Ванильный сахар']
+        )
+
+    def test_short_query_prefix_only(self):
+        """Запрос короче триграммы не ищется по вхождению подстроки"""
+        response = self.client.get(self.url, {'name': 'ах'})
+        self.assertEqual(response.data, [])
+        response = self.client.get(self.url, {'name': 'ахар'})
+        self.assertEqual(
+            [item['name'] for item in response.data],
+            ['Ванильный сахар', 'Сахар', 'Сахарная пудра']
+        )
+
+    def test_limit(self):
+        response = self.client.get(self.url, {'name': 'сахар', 'limit': 2})
+        self.assertEqual(len(response.data), 2)
+        response = self.client.get(self.url, {'name': 'с', 'limit': 1000})
+        self.assertLessEqual(len(response.data), 50)
+
+
+class CatalogConditionalGetTest(APITestCase):
+    """ETag и 304 для тегов и ингредиентов"""
+
+    def setUp(self):
+        create_tag()
+        Ingredient.objects.create(name='Картофель', measurement_unit='г')
+
+    def test_not_modified(self):
+        for url in ['/api/tags/', '/api/ingredients/',
+                    '/api/ingredients/?name=карт']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('ETag', response)
+            self.assertIn('max-age', response['Cache-Control'])
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_304_NOT_MODIFIED
+            )
+
+    def test_etag_changes_on_write(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Обед', color='#00FF00', slug='lunch')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_payload_served_from_memory(self):
+        self.client.get('/api/tags/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response.data[0]['slug'], 'breakfast')
@@ -0,0 +1,401 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from recipes import pantry, recommendations, search, similar
+from recipes.cache import invalidate_recipe_names
+from recipes.models import (
+    Recipe, Favorite, ShoppingCart, SimilarRecipe, SimilarRecipeRefresh,
+    Recommendation
+)
+from recipes.services import set_recipe_ingredients
+from recipes.testing import (
+    create_ingredients, create_recipe, create_tag, create_user
+)
+
+
+class RecipeFullTextSearchTest(APITestCase):
+    """Полнотекстовый поиск рецептов с учётом словоформ"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.soup = create_recipe(
+            self.user, 'Грибной суп', text='Сварить грибы.'
+        )
+        self.salad = create_recipe(
+            self.user, 'Салат', text='Подавать вместе с супами и грибами.'
+        )
+        self.cake = create_recipe(self.user, 'Торт', text='Испечь коржи.')
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_word_forms_and_rank(self):
+        self.assertEqual(self.search('супы'), [self.soup.id, self.salad.id])
+        self.assertEqual(self.search('грибами суп'), [
+            self.soup.id, self.salad.id
+        ])
+        self.assertEqual(self.search('коржей'), [self.cake.id])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_blank_query_ignored(self):
+        self.assertEqual(len(self.search(' ')), 3)
+
+    def test_cursor_pages_by_rank(self):
+        for i in range(6):
+            create_recipe(self.user, f'Суп {i}', text='Суп.')
+        expected = self.search('суп')
+        response = self.client.get(
+            '/api/recipes/', {'search': 'суп', 'pagination': 'cursor'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        seen = [recipe['id'] for recipe in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(recipe['id'] for recipe in response.data['results'])
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(seen[:len(expected)], expected)
+
+    def test_index_follows_changes(self):
+        self.cake.name = 'Суп-пюре'
+        self.cake.save()
+        self.assertIn(self.cake.id, self.search('суп'))
+        self.soup.delete()
+        self.assertNotIn(self.soup.id, self.search('суп'))
+
+    def test_index_usable_after_clear_data(self):
+        """clear_data не трогает служебные таблицы FTS5"""
+        call_command('clear_data', force=True, keep_users=True,
+                     stdout=StringIO())
+        self.assertEqual(self.search('суп'), [])
+        recipe = create_recipe(self.user, 'Грибной суп')
+        self.assertEqual(self.search('суп'), [recipe.id])
+
+    def test_explicit_ordering_wins(self):
+        response = self.client.get(
+            '/api/recipes/', {'search': 'суп', 'ordering': 'created_at'}
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.soup.id, self.salad.id]
+        )
+
+
+class RecipeNameSuggestTest(APITestCase):
+    """Подсказки по названиям рецептов из индекса в памяти"""
+
+    url = '/api/recipes/suggest/'
+
+    def setUp(self):
+        cache.clear()
+        search._recipe_names = None
+        self.user = create_user()
+        self.soup = create_recipe(self.user, 'Грибной суп')
+        self.pie = create_recipe(self.user, 'Пирог с грибами')
+        self.cake = create_recipe(self.user, 'Торт')
+        self.pie.favorites_count = 5
+        self.pie.save(update_fields=['favorites_count'])
+
+    def suggest(self, name, **params):
+        response = self.client.get(self.url, {'name': name, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data]
+
+    def test_prefix_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_word_prefix_by_popularity(self):
+        self.assertEqual(self.suggest('гриб'), [self.pie.id, self.soup.id])
+        self.assertEqual(self.suggest('ГРИБН'), [self.soup.id])
+        self.assertEqual(self.suggest('рибн'), [])
+        self.assertEqual(self.suggest('гриб', limit=1), [self.pie.id])
+
+    def test_index_follows_changes(self):
+        self.suggest('торт')
+        self.cake.name = 'Грибной торт'
+        self.cake.save()
+        self.assertIn(self.cake.id, self.suggest('гриб'))
+        self.soup.delete()
+        self.assertNotIn(self.soup.id, self.suggest('гриб'))
+
+    def test_changes_from_other_process(self):
+        self.suggest('торт')
+        # Изменение без сигналов, как в другом процессе
+        Recipe.objects.filter(pk=self.cake.pk).update(
+            name='Тортилья', updated_at=timezone.now()
+        )
+        invalidate_recipe_names()
+        self.assertEqual(self.suggest('тортил'), [self.cake.id])
+
+    def test_no_queries_when_warm(self):
+        self.suggest('гриб')
+        with self.assertNumQueries(0):
+            self.suggest('пир')
+
+
+class SimilarRecipesTest(APITestCase):
+    """Похожие рецепты по общим ингредиентам: top-K списки"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.ingredients = create_ingredients(6)
+        a, b, c, d, e, f = (item.id for item in self.ingredients)
+        self.soup = self.create_recipe('Суп', [a, b, c])
+        self.stew = self.create_recipe('Рагу', [a, b, d])
+        self.pie = self.create_recipe('Пирог', [a, e])
+        self.cake = self.create_recipe('Торт', [f])
+
+    def create_recipe(self, name, ingredient_ids):
+        recipe = create_recipe(self.user, name, ingredients={
+            ingredient_id: 10 for ingredient_id in ingredient_ids
+        })
+        similar.refresh_pending()
+        return recipe
+
+    def similar(self, recipe):
+        response = self.client.get(f'/api/recipes/{recipe.id}/similar/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data]
+
+    def stored(self):
+        return set(SimilarRecipe.objects.values_list(
+            'recipe_id', 'similar_id', 'score'
+        ))
+
+    def test_ranked_by_jaccard(self):
+        self.assertEqual(self.similar(self.soup), [self.stew.id, self.pie.id])
+        self.assertEqual(self.similar(self.cake), [])
+        response = self.client.get('/api/recipes/0/similar/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_incremental_matches_rebuild(self):
+        a, b, c, d, e, f = (item.id for item in self.ingredients)
+        set_recipe_ingredients(self.cake, {e: 10, f: 10})
+        similar.refresh_pending()
+        set_recipe_ingredients(self.stew, {c: 10, d: 10})
+        # До разбора очереди рагу остаётся в списке
+        self.assertEqual(
+            self.similar(self.pie), [self.cake.id, self.stew.id, self.soup.id]
+        )
+        call_command('rebuild_similar_recipes', pending=True, stdout=StringIO())
+        self.assertFalse(SimilarRecipeRefresh.objects.exists())
+        self.assertEqual(self.similar(self.pie), [self.cake.id, self.soup.id])
+        incremental = self.stored()
+        similar.rebuild()
+        self.assertEqual(incremental, self.stored())
+
+    def test_common_ingredient_ignored(self):
+        a, b, c, d, e, f = (item.id for item in self.ingredients)
+        # Ингредиент a есть в трёх рецептах и не делает их похожими
+        with self.settings(SIMILAR_RECIPES_MAX_POSTINGS=2):
+            similar.rebuild()
+            self.assertEqual(self.similar(self.soup), [self.stew.id])
+            self.assertEqual(self.similar(self.pie), [])
+            set_recipe_ingredients(self.pie, {a: 10, c: 10})
+            similar.refresh_pending()
+            incremental = self.stored()
+            similar.rebuild()
+        self.assertEqual(incremental, self.stored())
+        self.assertEqual(self.similar(self.pie), [self.soup.id])
+
+    def test_amount_change_keeps_lists(self):
+        a, b, c = (item.id for item in self.ingredients[:3])
+        set_recipe_ingredients(self.soup, {a: 20, b: 10, c: 10})
+        self.assertFalse(SimilarRecipeRefresh.objects.exists())
+
+    def test_detail_page_cards_have_user_flags(self):
+        Favorite.objects.create(user=self.user, recipe=self.stew)
+        self.client.force_login(self.user)
+        response = self.client.get(f'/recipes/{self.soup.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        flags = {
+            recipe.id: recipe.is_favorited
+            for recipe in response.context['similar_recipes']
+        }
+        self.assertEqual(flags, {self.stew.id: True, self.pie.id: False})
+
+    def test_read_is_bounded(self):
+        self.similar(self.soup)
+        # Ответы рецептов уже в кэше: список и флаги пользователя
+        with self.assertNumQueries(2):
+            self.similar(self.soup)
+
+
+class PantryMatchTest(APITestCase):
+    """Подбор рецептов по имеющимся продуктам"""
+
+    url = '/api/recipes/pantry/'
+
+    def setUp(self):
+        cache.clear()
+        pantry._index = None
+        self.user = create_user()
+        self.ingredients = create_ingredients(5)
+        a, b, c, d, e = (item.id for item in self.ingredients)
+        self.omelette = self.create_recipe('Омлет', [a, b], 10)
+        self.soup = self.create_recipe('Суп', [a, c, d, e], 60)
+        self.salad = self.create_recipe('Салат', [c, d], 5)
+        self.omelette.tags.add(create_tag())
+
+    def create_recipe(self, name, ingredient_ids, cooking_time):
+        return create_recipe(
+            self.user, name, cooking_time=cooking_time, ingredients={
+                ingredient_id: 10 for ingredient_id in ingredient_ids
+            }
+        )
+
+    def match(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            (item['id'], item['missing_ingredients'])
+            for item in response.data
+        ]
+
+    def test_ingredients_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'ingredients': 'соль'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ranked_by_coverage(self):
+        a, b, c, d, e = (item.id for item in self.ingredients)
+        self.assertEqual(self.match(ingredients=[a, c, d]), [
+            (self.salad.id, 0), (self.soup.id, 1), (self.omelette.id, 1)
+        ])
+        self.assertEqual(
+            self.match(ingredients=[a, c, d], limit=1), [(self.salad.id, 0)]
+        )
+
+    def test_filters(self):
+        a, c = self.ingredients[0].id, self.ingredients[2].id
+        self.assertEqual(
+            self.match(ingredients=[a, c], tags='breakfast'),
+            [(self.omelette.id, 1)]
+        )
+        self.assertEqual(
+            self.match(ingredients=[a, c], max_cooking_time=30),
+            [(self.salad.id, 1), (self.omelette.id, 1)]
+        )
+
+    def test_index_follows_changes(self):
+        a, b, c = (item.id for item in self.ingredients[:3])
+        self.match(ingredients=[c])
+        set_recipe_ingredients(self.omelette, {a: 10, b: 10, c: 10})
+        self.assertIn(
+            (self.omelette.id, 2), self.match(ingredients=[c])
+        )
+        self.salad.delete()
+        self.assertNotIn(self.salad.id, dict(self.match(ingredients=[c])))
+
+    def test_only_indexed_fields_invalidate(self):
+        a, b = self.ingredients[0].id, self.ingredients[1].id
+        index = pantry.get_pantry_index()
+        self.omelette.name = 'Омлет с зеленью'
+        self.omelette.save()
+        set_recipe_ingredients(self.omelette, {a: 20, b: 30})
+        self.assertIs(pantry.get_pantry_index(), index)
+        self.omelette.cooking_time = 40
+        self.omelette.save()
+        self.assertIsNot(pantry.get_pantry_index(), index)
+        self.assertEqual(
+            self.match(ingredients=[a], max_cooking_time=30), []
+        )
+
+    def test_stale_index_served_during_rebuild(self):
+        index = pantry.get_pantry_index()
+        self.salad.delete()
+        with pantry._index_lock:
+            self.assertIs(pantry.get_pantry_index(), index)
+        self.assertIsNot(pantry.get_pantry_index(), index)
+
+    def test_single_query_when_warm(self):
+        a = self.ingredients[0].id
+        self.match(ingredients=[a])
+        # Флаги пользователя для найденных рецептов
+        with self.assertNumQueries(1):
+            self.match(ingredients=[a])
+
+
+class RecommendationsTest(APITestCase):
+    """Рекомендации по избранному и корзинам, посчитанные заранее"""
+
+    url = '/api/recipes/recommended/'
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.users = [create_user(f'user{i}') for i in range(4)]
+        self.recipes = [
+            create_recipe(self.author, f'Рецепт {i}') for i in range(5)
+        ]
+        r1, r2, r3, r4, r5 = self.recipes
+        u1, u2, u3, u4 = self.users
+        self.marked = {
+            u1: [r1, r2], u2: [r1, r2, r3], u3: [r2, r3], u4: [r4]
+        }
+        for user, recipes in self.marked.items():
+            for recipe in recipes:
+                Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=u3, recipe=r5)
+        self.marked[u3].append(r5)
+
+    def recommended(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data]
+
+    def test_build_and_serve(self):
+        r1, r2, r3, r4, r5 = self.recipes
+        u1, u2, u3, u4 = self.users
+        Recommendation.objects.create(
+            user=self.author, recipe_ids=[r1.id], updated_at=timezone.now()
+        )
+        self.assertEqual(
+            recommendations.build(), Recommendation.objects.count()
+        )
+        # Рецепты, отмеченные пользователями с похожими вкусами
+        self.assertEqual(self.recommended(u1)[0], r3.id)
+        self.assertEqual(self.recommended(u3)[0], r1.id)
+        for user, recipes in self.marked.items():
+            self.assertFalse(
+                {recipe.id for recipe in recipes} & set(self.recommended(user))
+            )
+        # У автора нет отметок: устаревшая строка удалена,
+        # отдаются популярные рецепты
+        self.assertFalse(
+            Recommendation.objects.filter(user=self.author).exists()
+        )
+        self.assertEqual(self.recommended(self.author)[:2], [r2.id, r1.id])
+
+    def test_factorization_is_deterministic(self):
+        recommendations.build()
+        first = dict(Recommendation.objects.values_list('user', 'recipe_ids'))
+        recommendations.build()
+        self.assertEqual(
+            dict(Recommendation.objects.values_list('user', 'recipe_ids')),
+            first
+        )
+
+    def test_user_items_are_capped(self):
+        with mock.patch.object(recommendations, 'MAX_USER_ITEMS', 1):
+            matrix = recommendations.InteractionMatrix.load()
+        index = list(matrix.user_ids).index(self.users[1].id)
+        self.assertEqual(
+            matrix.item_ids[matrix.row(index)].tolist(), [self.recipes[2].id]
+        )
+
+    def test_single_read_when_cached(self):
+        recommendations.build()
+        self.recommended(self.users[0])
+        # Строка рекомендаций и флаги пользователя
+        with self.assertNumQueries(2):
+            self.recommended(self.users[0])
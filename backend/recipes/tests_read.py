@@ -0,0 +1,418 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from recipes.cache import get_many_or_build
+from recipes.models import (
+    Recipe, RecipeIngredient, Favorite, ShoppingCart, Subscription
+)
+from recipes.testing import (
+    create_ingredients, create_recipe, create_tag, create_user
+)
+
+
+class RecipeUserFlagsTest(APITestCase):
+    """Флаги is_favorited / is_in_shopping_cart считаются в queryset"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.recipes = [
+            create_recipe(self.user, f'Рецепт {i}', cooking_time=10 + i)
+            for i in range(6)
+        ]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[1])
+
+    def test_flags_values(self):
+        """Флаги корректны для авторизованного пользователя"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        flags = {
+            item['id']: (item['is_favorited'], item['is_in_shopping_cart'])
+            for item in response.data['results']
+        }
+        self.assertEqual(flags[self.recipes[0].id], (True, False))
+        self.assertEqual(flags[self.recipes[1].id], (False, True))
+        self.assertEqual(flags[self.recipes[2].id], (False, False))
+
+    def test_flags_anonymous(self):
+        """Для анонимного пользователя флаги всегда False"""
+        response = self.client.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['is_favorited'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+
+    def test_no_per_object_flag_queries(self):
+        """Нет отдельных запросов к избранному и корзине на каждый рецепт"""
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/recipes/')
+        flag_queries = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].lstrip().upper().startswith('SELECT 1 AS "A"')
+            and ('recipes_favorite' in q['sql']
+                 or 'recipes_shoppingcart' in q['sql'])
+        ]
+        self.assertEqual(flag_queries, [])
+
+
+class RecipeReadQueriesTest(APITestCase):
+    """Число запросов при чтении рецептов не зависит от размера страницы"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.author = create_user('author')
+        self.tag = create_tag()
+        self.ingredients = create_ingredients(5)
+        Subscription.objects.create(user=self.user, author=self.author)
+
+    def create_recipes(self, count, ingredients_count):
+        for i in range(count):
+            create_recipe(
+                self.author, f'Рецепт {i}', tags=[self.tag], ingredients={
+                    ingredient.id: 10
+                    for ingredient in self.ingredients[:ingredients_count]
+                }
+            )
+
+    def count_list_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response
+
+    def test_api_list_queries_constant(self):
+        """API: запросов столько же для 1 и 6 рецептов"""
+        self.client.force_authenticate(user=self.user)
+        self.create_recipes(1, 1)
+        small, _ = self.count_list_queries('/api/recipes/')
+        self.create_recipes(5, 5)
+        large, response = self.count_list_queries('/api/recipes/')
+        self.assertEqual(small, large)
+        self.assertTrue(response.data['results'][0]['author']['is_subscribed'])
+
+    def test_home_page_queries_constant(self):
+        """Главная страница: запросов столько же для 1 и 6 рецептов"""
+        self.client.force_login(self.user)
+        self.create_recipes(1, 1)
+        small, _ = self.count_list_queries('/')
+        self.create_recipes(5, 5)
+        large, _ = self.count_list_queries('/')
+        self.assertEqual(small, large)
+
+    def test_detail_page_subscription_flag(self):
+        """Страница рецепта получает флаг подписки из queryset"""
+        self.client.force_login(self.user)
+        self.create_recipes(1, 5)
+        recipe = Recipe.objects.get()
+        response = self.client.get(f'/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.context['is_subscribed'])
+
+
+class RecipeCursorPaginationTest(APITestCase):
+    """Keyset-пагинация включается по запросу, ?page= работает как раньше"""
+
+    def setUp(self):
+        self.user = create_user()
+        for i in range(10):
+            create_recipe(self.user, f'Рецепт {i}', cooking_time=10 + i)
+
+    def test_page_number_by_default(self):
+        """Без параметров ответ содержит count и номер страницы"""
+        response = self.client.get('/api/recipes/', {'page': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_cursor_walks_all_recipes(self):
+        """Проход по ссылкам next возвращает все рецепты без повторов"""
+        response = self.client.get('/api/recipes/', {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        seen = [item['id'] for item in response.data['results']]
+        next_url = response.data['next']
+        while next_url:
+            self.assertIn('cursor=', next_url)
+            response = self.client.get(next_url)
+            seen.extend(item['id'] for item in response.data['results'])
+            next_url = response.data['next']
+        expected = list(
+            Recipe.objects.order_by('-created_at', 'id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_cursor_with_ordering(self):
+        """Keyset-пагинация по каждой разрешённой сортировке"""
+        follower = create_user('follower')
+        recipes = list(Recipe.objects.order_by('id'))
+        Favorite.objects.create(user=follower, recipe=recipes[3])
+        ShoppingCart.objects.create(user=follower, recipe=recipes[5])
+        for ordering in ['-favorites_count', 'in_carts_count',
+                         '-author__subscribers_count', 'created_at']:
+            response = self.client.get('/api/recipes/', {
+                'pagination': 'cursor', 'ordering': ordering
+            })
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen = [item['id'] for item in response.data['results']]
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                seen.extend(item['id'] for item in response.data['results'])
+            expected = list(
+                Recipe.objects.order_by(ordering, 'id')
+                .values_list('id', flat=True)
+            )
+            self.assertEqual(seen, expected, ordering)
+
+    def test_cursor_has_no_count_query(self):
+        """Keyset-страница не выполняет COUNT(*)"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/recipes/', {'pagination': 'cursor'})
+        self.assertFalse(any(
+            'COUNT(*)' in q['sql'].upper() for q in ctx.captured_queries
+        ))
+
+    def test_subscriptions_cursor(self):
+        """Keyset-пагинация подписок"""
+        follower = create_user('follower')
+        Subscription.objects.create(user=follower, author=self.user)
+        self.client.force_authenticate(user=follower)
+        response = self.client.get(
+            '/api/users/subscriptions/', {'pagination': 'cursor'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(response.data['results'][0]['id'], self.user.id)
+
+
+class RecipeCountCacheTest(APITestCase):
+    """Количество рецептов в списке кэшируется по набору фильтров"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.tag = create_tag()
+        for i in range(3):
+            create_recipe(self.user, f'Рецепт {i}', tags=[self.tag])
+
+    def test_second_request_uses_cached_count(self):
+        """Повторный запрос не выполняет COUNT(*)"""
+        first = self.client.get('/api/recipes/', {'tags': 'breakfast'})
+        self.assertTrue(first.data['count_is_exact'])
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(
+                '/api/recipes/', {'tags': 'breakfast', 'page': 1}
+            )
+        self.assertEqual(second.data['count'], 3)
+        self.assertFalse(second.data['count_is_exact'])
+        self.assertFalse(any(
+            'COUNT(*)' in q['sql'].upper() for q in ctx.captured_queries
+        ))
+
+    def test_write_invalidates_count(self):
+        """Создание рецепта сбрасывает закэшированное количество"""
+        self.client.get('/api/recipes/')
+        create_recipe(self.user, 'Новый рецепт')
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data['count'], 4)
+        self.assertTrue(response.data['count_is_exact'])
+
+    def test_user_filters_cached_per_user(self):
+        """Фильтр is_favorited кэшируется отдельно для каждого пользователя"""
+        other = create_user('other')
+        Favorite.objects.create(user=self.user, recipe=Recipe.objects.first())
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/recipes/', {'is_favorited': 'true'})
+        self.assertEqual(response.data['count'], 1)
+        self.client.force_authenticate(user=other)
+        response = self.client.get('/api/recipes/', {'is_favorited': 'true'})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_favorite_keeps_shared_counts(self):
+        """Избранное пользователя не сбрасывает общие количества"""
+        self.client.get('/api/recipes/')
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/recipes/', {'is_favorited': 'true'})
+        recipe = Recipe.objects.first()
+        self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get('/api/recipes/', {'is_favorited': 'true'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertTrue(response.data['count_is_exact'])
+        self.client.force_authenticate(user=None)
+        response = self.client.get('/api/recipes/')
+        self.assertFalse(response.data['count_is_exact'])
+
+
+class RecipeTagFilterTest(APITestCase):
+    """Фильтр по тегам: рецепт содержит все выбранные теги"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.tags = [
+            create_tag(f'tag{i}', f'Тег {i}') for i in range(3)
+        ]
+        self.both = create_recipe(
+            self.user, 'Оба тега', tags=self.tags[:2]
+        )
+        self.one = create_recipe(self.user, 'Один тег', tags=self.tags[:1])
+
+    def get_ids(self, slugs):
+        response = self.client.get('/api/recipes/', {'tags': slugs})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.data['results']}
+
+    def test_single_tag(self):
+        self.assertEqual(self.get_ids(['tag0']), {self.both.id, self.one.id})
+
+    def test_all_tags_required(self):
+        self.assertEqual(self.get_ids(['tag0', 'tag1']), {self.both.id})
+        self.assertEqual(self.get_ids(['tag0', 'tag2']), set())
+
+    def test_duplicate_slugs(self):
+        self.assertEqual(
+            self.get_ids(['tag1', 'tag1']), {self.both.id}
+        )
+
+    def test_no_join_per_tag(self):
+        """Число JOIN не растёт с количеством тегов"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/recipes/', {'tags': ['tag0', 'tag1', 'tag2']})
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries).upper()
+        self.assertNotIn('DISTINCT', sql)
+
+
+class RecipeDetailCacheTest(APITestCase):
+    """Кэш ответа GET /api/recipes/{id}/ и его сброс"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.author = create_user('author')
+        self.ingredient, = create_ingredients(1)
+        self.recipe = create_recipe(
+            self.author, tags=[create_tag()],
+            ingredients={self.ingredient.id: 100}
+        )
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def test_cached_hit_single_query(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 100)
+
+    def test_user_flags_not_cached(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.url)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['is_favorited'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+        self.assertTrue(response.data['author']['is_subscribed'])
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertFalse(response.data['is_favorited'])
+        self.assertFalse(response.data['author']['is_subscribed'])
+
+    def test_invalidation(self):
+        self.client.get(self.url)
+        RecipeIngredient.objects.filter(recipe=self.recipe).update(amount=5)
+        RecipeIngredient.objects.get(recipe=self.recipe).save()
+        self.assertEqual(
+            self.client.get(self.url).data['ingredients'][0]['amount'], 5
+        )
+        self.recipe.tags.add(create_tag('lunch', 'Обед'))
+        self.assertEqual(len(self.client.get(self.url).data['tags']), 2)
+        self.author.first_name = 'Иван'
+        self.author.save()
+        self.assertEqual(
+            self.client.get(self.url).data['author']['first_name'], 'Иван'
+        )
+
+    def test_media_urls_follow_request_host(self):
+        self.recipe.image = 'recipes/soup.jpg'
+        self.recipe.save()
+        response = self.client.get(self.url, HTTP_HOST='localhost')
+        self.assertEqual(
+            response.data['image'], 'http://localhost/media/recipes/soup.jpg'
+        )
+        response = self.client.get(
+            self.url, HTTP_HOST='127.0.0.1', secure=True
+        )
+        self.assertEqual(
+            response.data['image'], 'https://127.0.0.1/media/recipes/soup.jpg'
+        )
+
+    def test_not_found(self):
+        response = self.client.get('/api/recipes/999999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/recipes/abc/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SingleFlightCacheTest(TestCase):
+    """Single-flight и досрочное обновление кэша рецептов"""
+
+    def setUp(self):
+        cache.delete_many(['sf:key', 'sf:key:lock'])
+        self.calls = []
+
+    def build(self, keys):
+        self.calls.append(list(keys))
+        return {key: f'value-{len(self.calls)}' for key in keys}
+
+    def get(self):
+        return get_many_or_build({'sf:key': 1}, self.build, 60)['sf:key']
+
+    def test_build_once_then_hit(self):
+        self.assertEqual(self.get(), 'value-1')
+        self.assertEqual(self.get(), 'value-1')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_stale_served_while_locked(self):
+        self.get()
+        get_many_or_build({'sf:key': 2}, self.build, 60)
+        cache.add('sf:key:lock', 1)
+        value = get_many_or_build({'sf:key': 3}, self.build, 60)['sf:key']
+        self.assertEqual(value, 'value-2')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_waits_then_builds_when_locked_and_empty(self):
+        cache.add('sf:key:lock', 1)
+        with mock.patch('recipes.cache.BUILD_WAIT_TIMEOUT', 0.1):
+            self.assertEqual(self.get(), 'value-1')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_early_refresh_near_expiry(self):
+        self.get()
+        entry = cache.get('sf:key')
+        entry['expires'] = time.time() - 1
+        cache.set('sf:key', entry)
+        self.assertEqual(self.get(), 'value-2')
+        self.assertFalse(cache.get('sf:key:lock'))
+
+
+class RecipeListPayloadCacheTest(APITestCase):
+    """Страница списка рецептов собирается из кэша ответов"""
+
+    def setUp(self):
+        self.user = create_user()
+        for i in range(3):
+            create_recipe(self.user, f'Рецепт {i}')
+
+    def test_second_page_load_skips_serialization_queries(self):
+        self.client.get('/api/recipes/')
+        # Кэшированный count и ответы: только запрос состояний
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(len(response.data['results']), 3)
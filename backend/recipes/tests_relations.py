@@ -0,0 +1,227 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from recipes.models import (
+    Recipe, Ingredient, Favorite, ShoppingCart, Subscription, ShoppingListItem
+)
+from recipes.testing import create_recipe, create_user
+
+User = get_user_model()
+
+
+class RelationToggleTest(APITestCase):
+    """Избранное, корзина и подписки меняются одним запросом"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.author = create_user('author')
+        self.ingredient = Ingredient.objects.create(
+            name='Картофель', measurement_unit='г'
+        )
+        self.recipe = create_recipe(
+            self.author, 'Суп', ingredients={self.ingredient.id: 200}
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_favorite_single_statement(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        # INSERT и UPDATE счётчика в одной транзакции
+        with self.assertNumQueries(4):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 1)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_missing_recipe(self):
+        response = self.client.post('/api/recipes/999999/favorite/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post('/api/recipes/999999/shopping_cart/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_shopping_cart_updates_shopping_list(self):
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self.assertEqual(
+            self.client.post(url).status_code, status.HTTP_201_CREATED
+        )
+        self.assertEqual(
+            self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            list(ShoppingListItem.objects.values_list('amount', flat=True)),
+            [200]
+        )
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT
+        )
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.author.id}/subscribe/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['is_subscribed'])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/users/999999/subscribe/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Subscription.objects.count(), 1)
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT
+        )
+        self.assertFalse(Subscription.objects.exists())
+
+
+class BulkRelationTest(APITestCase):
+    """Пакетное добавление и удаление рецептов в избранном и корзине"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.ingredient = Ingredient.objects.create(
+            name='Картофель', measurement_unit='г'
+        )
+        self.recipes = [
+            create_recipe(
+                self.user, f'Рецепт {i}', ingredients={self.ingredient.id: 100}
+            )
+            for i in range(5)
+        ]
+        self.ids = [recipe.id for recipe in self.recipes]
+        self.client.force_authenticate(user=self.user)
+
+    def statuses(self, response):
+        return {item['id']: item['status'] for item in response.data['results']}
+
+    def test_add_and_remove_favorites(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'recipes': self.ids[:3] + [999999]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.statuses(response), {
+            self.ids[0]: 'exists', self.ids[1]: 'added',
+            self.ids[2]: 'added', 999999: 'not_found',
+        })
+        response = self.client.delete(
+            '/api/recipes/favorite/',
+            {'recipes': [self.ids[1], self.ids[4]]}, format='json'
+        )
+        self.assertEqual(self.statuses(response), {
+            self.ids[1]: 'removed', self.ids[4]: 'not_found',
+        })
+        self.assertEqual(
+            set(Favorite.objects.values_list('recipe_id', flat=True)),
+            {self.ids[0], self.ids[2]}
+        )
+
+    def test_cart_queries_do_not_grow(self):
+        def count(ids):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(
+                    '/api/recipes/shopping_cart/',
+                    {'recipes': ids}, format='json'
+                )
+            return len(queries)
+
+        self.assertEqual(count(self.ids[:1]), count(self.ids[1:]))
+        self.assertEqual(
+            list(ShoppingListItem.objects.values_list('amount', flat=True)),
+            [500]
+        )
+
+    def test_clear_cart(self):
+        self.client.post(
+            '/api/recipes/shopping_cart/', {'recipes': self.ids}, format='json'
+        )
+        response = self.client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_invalid_payload(self):
+        response = self.client.post(
+            '/api/recipes/favorite/', {'recipes': []}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PopularityCountersTest(APITestCase):
+    """Денормализованные счётчики избранного, корзин, подписчиков и рецептов"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.author = create_user('author')
+        self.recipes = [
+            create_recipe(self.author, f'Рецепт {i}') for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_counters_follow_api_and_orm(self):
+        recipe = self.recipes[0]
+        self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [recipe.id, self.recipes[1].id]}, format='json'
+        )
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 2)
+        self.assertEqual(recipe.in_carts_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(self.author.recipes_count, 3)
+
+        self.client.delete('/api/recipes/shopping_cart/clear/')
+        self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.recipes[2].delete()
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(recipe.in_carts_count, 0)
+        self.assertEqual(self.author.subscribers_count, 0)
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_stale_instance_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_reconcile_command(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(favorites_count=7)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=0)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('2', out.getvalue())
+        self.recipes[0].refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipes[0].favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 3)
+
+    def test_ordering_by_popularity(self):
+        popular = self.recipes[1]
+        Favorite.objects.create(user=self.user, recipe=popular)
+        Favorite.objects.create(user=self.author, recipe=popular)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[2])
+        response = self.client.get(
+            '/api/recipes/', {'ordering': '-favorites_count'}
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [popular.id, self.recipes[2].id, self.recipes[0].id]
+        )
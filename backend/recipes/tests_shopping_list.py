@@ -0,0 +1,186 @@
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db.models import Sum
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from recipes import shopping_list
+from recipes.checks import check_pdf_font
+from recipes.exporters import PDFRenderer
+from recipes.models import (
+    Ingredient, RecipeIngredient, ShoppingCart, ShoppingListItem
+)
+from recipes.testing import create_recipe, create_user
+
+
+class ShoppingListTestCase(APITestCase):
+    """Суп (картофель 200) и рагу (картофель 300, лук 50)."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.potato = Ingredient.objects.create(
+            name='Картофель', measurement_unit='г'
+        )
+        self.onion = Ingredient.objects.create(
+            name='Лук', measurement_unit='г'
+        )
+        self.soup = create_recipe(
+            self.user, 'Суп', ingredients={self.potato.id: 200}
+        )
+        self.stew = create_recipe(
+            self.user, 'Рагу',
+            ingredients={self.potato.id: 300, self.onion.id: 50}
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def totals(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.user)
+            .values_list('ingredient__name', 'amount')
+        )
+
+
+class ShoppingListAggregateTest(ShoppingListTestCase):
+    """Список покупок поддерживается при изменении корзины и рецептов"""
+
+    def expected_totals(self):
+        return dict(
+            RecipeIngredient.objects.filter(
+                recipe__in_shopping_cart__user=self.user
+            ).values_list('ingredient__name').annotate(Sum('amount'))
+        )
+
+    def test_cart_add_and_remove(self):
+        self.client.post(f'/api/recipes/{self.soup.id}/shopping_cart/')
+        self.client.post(f'/api/recipes/{self.stew.id}/shopping_cart/')
+        self.assertEqual(self.totals(), {'Картофель': 500, 'Лук': 50})
+        self.client.delete(f'/api/recipes/{self.stew.id}/shopping_cart/')
+        self.assertEqual(self.totals(), {'Картофель': 200})
+
+    def test_ingredient_edit_on_carted_recipe(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.stew)
+        item = RecipeIngredient.objects.get(
+            recipe=self.stew, ingredient=self.onion
+        )
+        item.amount = 80
+        item.save()
+        RecipeIngredient.objects.filter(
+            recipe=self.stew, ingredient=self.potato
+        ).delete()
+        self.assertEqual(self.totals(), {'Лук': 80})
+        self.assertEqual(self.totals(), self.expected_totals())
+
+    def test_deltas_upsert_existing_rows(self):
+        """Позиция, вставленная параллельно, увеличивается, а не
+        вставляется повторно"""
+        ShoppingListItem.objects.create(
+            user=self.user, ingredient=self.potato, amount=100
+        )
+        shopping_list.apply_deltas({
+            (self.user.id, self.potato.id): 200,
+            (self.user.id, self.onion.id): 50,
+        })
+        self.assertEqual(self.totals(), {'Картофель': 300, 'Лук': 50})
+        shopping_list.apply_deltas({
+            (self.user.id, self.potato.id): -300,
+            (self.user.id, self.onion.id): -80,
+        })
+        self.assertEqual(self.totals(), {})
+
+    def test_recipe_delete(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.soup)
+        ShoppingCart.objects.create(user=self.user, recipe=self.stew)
+        self.stew.delete()
+        self.assertEqual(self.totals(), {'Картофель': 200})
+
+    def test_download_single_query(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.stew)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/recipes/download_shopping_cart/')
+            content = b''.join(response.streaming_content).decode()
+        self.assertIn('Картофель (г) — 300', content)
+        self.assertIn('Лук (г) — 50', content)
+
+    def test_rebuild_command_repairs_drift(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.stew)
+        ShoppingListItem.objects.filter(user=self.user).update(amount=1)
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        self.assertEqual(self.totals(), {'Картофель': 300, 'Лук': 50})
+
+    def test_rebuild_command_for_user(self):
+        """Корзины других пользователей не умножают суммы"""
+        other = create_user('other')
+        for user in (self.user, other, create_user('third')):
+            ShoppingCart.objects.create(user=user, recipe=self.soup)
+        ShoppingListItem.objects.update(amount=1)
+        call_command(
+            'rebuild_shopping_lists', '--user', str(self.user.id),
+            stdout=StringIO()
+        )
+        self.assertEqual(self.totals(), {'Картофель': 200})
+        self.assertEqual(
+            ShoppingListItem.objects.get(user=other).amount, 1
+        )
+
+
+class ShoppingListExportTest(ShoppingListTestCase):
+    """Потоковая выгрузка списка покупок в txt, csv и pdf"""
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        ShoppingCart.objects.create(user=self.user, recipe=self.soup)
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b''.join(response.streaming_content)
+
+    def test_formats(self):
+        response, content = self.download()
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertEqual(content.decode(), 'Картофель (г) — 200')
+
+        response, content = self.download(format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('Картофель,г,200', content.decode('utf-8-sig'))
+        self.assertIn('shopping_list.csv', response['Content-Disposition'])
+
+        response, content = self.download(format='pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_missing_font_reported_by_check(self):
+        with self.settings(SHOPPING_LIST_PDF_FONT='/nonexistent/font.ttf'):
+            warnings = check_pdf_font(None)
+        self.assertEqual(
+            [warning.id for warning in warnings], ['recipes.W002']
+        )
+        self.assertEqual(check_pdf_font(None), [])
+
+    def test_missing_font_fails_pdf_export(self):
+        renderer = PDFRenderer()
+        renderer.font_name = 'MissingShoppingListFont'
+        with self.settings(SHOPPING_LIST_PDF_FONT='/nonexistent/font.ttf'):
+            with self.assertRaises(ImproperlyConfigured):
+                renderer.get_font()
+
+    def test_cached_file_and_etag(self):
+        response, first = self.download(format='csv')
+        with self.assertNumQueries(0):
+            _, second = self.download(format='csv')
+        self.assertEqual(first, second)
+        response = self.client.get(
+            self.url, {'format': 'csv'}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cart_change_resets_cache(self):
+        response, _ = self.download()
+        ShoppingCart.objects.filter(user=self.user).delete()
+        response2, content = self.download()
+        self.assertNotEqual(response['ETag'], response2['ETag'])
+        self.assertEqual(content, b'')
@@ -0,0 +1,162 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from recipes.feed import PULL_AUTHORS_KEY
+from recipes.models import Subscription, FeedItem
+from recipes.testing import create_recipe, create_user
+
+
+class SubscriptionListTest(APITestCase):
+    """Подписки отдаются с рецептами авторов фиксированным числом запросов"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client.force_authenticate(user=self.user)
+
+    def add_author(self, index, recipes=4):
+        author = create_user(f'author{index}')
+        for i in range(recipes):
+            create_recipe(author, f'Рецепт {index}-{i}')
+        Subscription.objects.create(user=self.user, author=author)
+        return author
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/subscriptions/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_recipes_limit(self):
+        author = self.add_author(1)
+        response, _ = self.get(recipes_limit=2)
+        item = response.data['results'][0]
+        self.assertEqual(item['recipes_count'], 4)
+        self.assertTrue(item['is_subscribed'])
+        self.assertEqual(
+            [recipe['id'] for recipe in item['recipes']],
+            list(
+                author.recipes.order_by('-created_at', '-id')
+                .values_list('id', flat=True)[:2]
+            )
+        )
+
+    def test_limit_is_capped(self):
+        self.add_author(1, recipes=3)
+        with self.settings(SUBSCRIPTION_RECIPES_LIMIT=2,
+                           SUBSCRIPTION_RECIPES_MAX_LIMIT=1):
+            response, _ = self.get()
+            self.assertEqual(len(response.data['results'][0]['recipes']), 2)
+            response, _ = self.get(recipes_limit=3)
+            self.assertEqual(len(response.data['results'][0]['recipes']), 1)
+
+    def test_queries_do_not_grow_with_authors(self):
+        self.add_author(1)
+        _, single = self.get(recipes_limit=2)
+        for index in range(2, 6):
+            self.add_author(index)
+        response, many = self.get(recipes_limit=2)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(single, many)
+
+    def test_invalid_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 'abc'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SubscriptionFeedTest(APITestCase):
+    """Лента рецептов авторов из подписок"""
+
+    url = '/api/recipes/feed/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.authors = [create_user(f'author{i}') for i in range(3)]
+        self.client.force_authenticate(user=self.user)
+
+    def feed_ids(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_feed_follows_subscriptions(self):
+        old = create_recipe(self.authors[0], 'Старый')
+        create_recipe(self.authors[1], 'Чужой')
+        response = self.client.post(
+            f'/api/users/{self.authors[0].id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        new = create_recipe(self.authors[0], 'Новый')
+        self.assertEqual(self.feed_ids(), [new.id, old.id])
+        self.client.delete(f'/api/users/{self.authors[0].id}/subscribe/')
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_queries_do_not_grow_with_subscriptions(self):
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        create_recipe(self.authors[0], 'Рецепт')
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(self.url)
+        for author in self.authors[1:]:
+            Subscription.objects.create(user=self.user, author=author)
+            for i in range(3):
+                create_recipe(author, f'Рецепт {i}')
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(single), len(many))
+
+    def test_cursor_pages(self):
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        recipes = [
+            create_recipe(self.authors[0], f'Рецепт {i}') for i in range(8)
+        ]
+        response = self.client.get(self.url)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        response = self.client.get(response.data['next'])
+        ids += [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_popular_author_pulled_on_read(self):
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        with self.settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            cache.clear()
+            recipe = create_recipe(self.authors[0], 'Рецепт')
+            self.assertFalse(FeedItem.objects.exists())
+            self.assertEqual(self.feed_ids(), [recipe.id])
+            self.assertFalse(FeedItem.objects.exists())
+
+    def test_pulled_recipes_merged_across_pages(self):
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        Subscription.objects.create(user=self.user, author=self.authors[1])
+        Subscription.objects.create(
+            user=self.authors[2], author=self.authors[1]
+        )
+        with self.settings(FEED_FANOUT_MAX_FOLLOWERS=1):
+            cache.clear()
+            recipes = [
+                create_recipe(self.authors[i % 2], f'Рецепт {i}')
+                for i in range(9)
+            ]
+            ids = []
+            response = self.client.get(self.url)
+            while True:
+                ids += [recipe['id'] for recipe in response.data['results']]
+                if not response.data['next']:
+                    break
+                response = self.client.get(response.data['next'])
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_author_back_under_limit_gets_fanned_out(self):
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        with self.settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            cache.clear()
+            recipe = create_recipe(self.authors[0], 'Рецепт')
+        cache.delete(PULL_AUTHORS_KEY)
+        self.assertEqual(self.feed_ids(), [recipe.id])
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.user, recipe=recipe).exists()
+        )
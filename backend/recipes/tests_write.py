@@ -0,0 +1,185 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from recipes.models import (
+    RecipeIngredient, ShoppingCart, ShoppingListItem, Tag
+)
+from recipes.serializers import RecipeCreateUpdateSerializer
+from recipes.services import set_recipe_ingredients
+from recipes.testing import (
+    create_ingredients, create_recipe, create_tag, create_user
+)
+
+
+class RecipeWriteTestCase(APITestCase):
+    ingredients_count = 30
+
+    def setUp(self):
+        self.user = create_user()
+        self.ingredients = create_ingredients(self.ingredients_count)
+        self.recipe = create_recipe(self.user, 'Суп')
+        self.client.force_authenticate(user=self.user)
+
+
+class RecipeIngredientsWriteTest(RecipeWriteTestCase):
+    """Ингредиенты рецепта сохраняются пакетно и по разнице"""
+
+    def test_statement_count_does_not_grow(self):
+        amounts = {ingredient.id: 10 for ingredient in self.ingredients}
+        with CaptureQueriesContext(connection) as queries:
+            set_recipe_ingredients(self.recipe, amounts)
+        self.assertLessEqual(len(queries), 8)
+        self.assertEqual(self.recipe.recipe_ingredients.count(), 30)
+
+    def test_unchanged_rows_keep_primary_keys(self):
+        first, second, third = self.ingredients[:3]
+        set_recipe_ingredients(self.recipe, {first.id: 10, second.id: 20})
+        kept = RecipeIngredient.objects.get(
+            recipe=self.recipe, ingredient=first
+        )
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {'ingredients': [
+                {'id': first.id, 'amount': 10},
+                {'id': third.id, 'amount': 30},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = dict(
+            self.recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )
+        )
+        self.assertEqual(rows, {first.id: 10, third.id: 30})
+        self.assertTrue(RecipeIngredient.objects.filter(pk=kept.pk).exists())
+
+    def test_shopping_list_follows_diff(self):
+        first, second = self.ingredients[:2]
+        set_recipe_ingredients(self.recipe, {first.id: 10, second.id: 20})
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        set_recipe_ingredients(self.recipe, {first.id: 15})
+        self.assertEqual(
+            dict(
+                ShoppingListItem.objects.filter(user=self.user)
+                .values_list('ingredient_id', 'amount')
+            ),
+            {first.id: 15}
+        )
+
+
+class RecipeWriteValidationTest(RecipeWriteTestCase):
+    """id ингредиентов и тегов проверяются одним запросом на список"""
+
+    def setUp(self):
+        super().setUp()
+        self.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color='#FF0000', slug=f'tag-{i}')
+            for i in range(3)
+        )
+
+    def get_serializer(self, data):
+        return RecipeCreateUpdateSerializer(
+            self.recipe, data=data, partial=True
+        )
+
+    def test_two_queries_for_any_recipe_size(self):
+        serializer = self.get_serializer({
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients
+            ],
+            'tags': [tag.id for tag in self.tags],
+        })
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_all_missing_ids_reported(self):
+        serializer = self.get_serializer({
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 10},
+                {'id': 999998, 'amount': 10},
+                {'id': 999999, 'amount': 10},
+            ],
+            'tags': [self.tags[0].id, 999999],
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('999998, 999999', str(serializer.errors['ingredients']))
+        self.assertIn('999999', str(serializer.errors['tags']))
+
+    def test_duplicates_rejected_without_query(self):
+        ingredient = self.ingredients[0]
+        serializer = self.get_serializer({
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10},
+                {'id': ingredient.id, 'amount': 20},
+            ],
+        })
+        with self.assertNumQueries(0):
+            self.assertFalse(serializer.is_valid())
+        self.assertIn('повторяются', str(serializer.errors['ingredients']))
+
+    def test_patch_sets_tags(self):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {'tags': [self.tags[1].id]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['id'] for tag in response.data['tags']], [self.tags[1].id]
+        )
+
+
+class RecipeFormWriteTest(RecipeWriteTestCase):
+    """HTML-форма сохраняет рецепт через тот же сервис, что и API"""
+
+    ingredients_count = 20
+
+    def setUp(self):
+        super().setUp()
+        self.tag = create_tag()
+        self.recipe.image = 'recipes/soup.jpg'
+        self.recipe.save()
+        self.recipe.tags.set([self.tag])
+        self.client.force_login(self.user)
+
+    def post(self, ingredients):
+        return self.client.post(
+            f'/recipes/{self.recipe.id}/edit/',
+            {
+                'name': 'Суп', 'text': 'Описание', 'cooking_time': 15,
+                'tags': [self.tag.id],
+                'ingredients_data': json.dumps(ingredients),
+            }
+        )
+
+    def test_queries_do_not_grow_with_ingredients(self):
+        def count(size):
+            with CaptureQueriesContext(connection) as queries:
+                self.post([
+                    {'id': ingredient.id, 'amount': 10}
+                    for ingredient in self.ingredients[:size]
+                ])
+            return len(queries)
+
+        small = count(2)
+        RecipeIngredient.objects.all().delete()
+        self.assertEqual(count(20), small)
+        self.assertEqual(self.recipe.recipe_ingredients.count(), 20)
+        self.assertEqual(list(self.recipe.tags.all()), [self.tag])
+
+    def test_unknown_ingredient_leaves_recipe_untouched(self):
+        response = self.post([
+            {'id': self.ingredients[0].id, 'amount': 10},
+            {'id': 999999, 'amount': 10},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '999999')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.cooking_time, 10)
+        self.assertFalse(self.recipe.recipe_ingredients.exists())
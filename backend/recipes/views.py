@@ -1,8 +1,13 @@
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.generic import View, DetailView, DeleteView
-from django.http import HttpResponse
+from django.http import (
+    Http404, HttpResponseNotModified, StreamingHttpResponse
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags, quote_etag
 from django.urls import reverse_lazy
-from django.db.models import Sum
+from django.db import transaction
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
 from rest_framework import viewsets, status
@@ -10,108 +15,425 @@
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-import json
+from api.pagination import FeedPagination, RecipePagination
 from .models import (
     Recipe, Ingredient, Tag,
-    Favorite, ShoppingCart, Subscription,
-    RecipeIngredient
+    RecipeIngredient, ShoppingListItem, Recommendation
 )
 from .serializers import (
     RecipeSerializer, RecipeCreateUpdateSerializer,
-    IngredientSerializer, TagSerializer
+    IngredientSerializer, TagSerializer, RecipeIdsSerializer,
+    PantrySerializer
 )
 from .forms import RecipeForm
 from .permissions import IsAuthorOrReadOnly
-from .filters import RecipeFilter, IngredientFilter
+from .filters import (
+    RecipeFilter, IngredientFilter, RecipeOrderingFilter, RecipeSearchFilter
+)
+from .search import get_ingredient_index, get_recipe_name_index
+from .mixins import CatalogCacheMixin
+from .cache import (
+    cache_streamed, get_recipe_payloads, get_shopping_list_version
+)
+from .exporters import SHOPPING_LIST_RENDERERS
+from .feed import get_feed
+from .pantry import get_pantry_index
+from .similar import get_similar_ids
+from .services import (
+    add_to_favorites, add_to_shopping_cart, remove_from_favorites,
+    remove_from_shopping_cart, save_recipe
+)
+
+
+def get_limit(request, default, maximum):
+    """?limit= в пределах от 1 до maximum."""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        limit = default
+    return min(max(limit, 1), maximum)
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [
+        DjangoFilterBackend, RecipeSearchFilter, RecipeOrderingFilter
+    ]
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
+    # Счётчики денормализованы (recipes.counters), сортировка по ним
+    # не требует агрегатов
+    ordering_fields = (
+        'created_at', 'favorites_count', 'in_carts_count',
+        'author__subscribers_count',
+    )
+    ordering = ('-created_at', 'id')
+
+    def get_queryset(self):
+        return Recipe.objects.for_read(self.request.user)
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return RecipeCreateUpdateSerializer
         return RecipeSerializer
 
+    # Поля, которые читаются из БД при каждом запросе; остальная часть
+    # ответа берётся из кэша (recipes.cache.get_recipe_payloads)
+    state_fields = (
+        'id', 'created_at', 'updated_at', 'is_favorited',
+        'is_in_shopping_cart', 'author_is_subscribed',
+    )
+
+    def get_state_queryset(self):
+        queryset = self.filter_queryset(
+            Recipe.objects.with_user_flags(self.request.user)
+        )
+        # Keyset-пагинация берёт позицию курсора из полей сортировки
+        # строки, поэтому они читаются вместе с состоянием
+        ordering_fields = [
+            field.lstrip('-') for field in queryset.query.order_by
+            if isinstance(field, str)
+        ]
+        return queryset.values(*dict.fromkeys(
+            [*self.state_fields, *ordering_fields]
+        ))
+
+    def build_payloads(self, ids):
+        recipes = list(self.get_queryset().filter(id__in=ids))
+        # Без request в контексте ссылки на медиафайлы остаются
+        # относительными: хост и схема добавляются в get_cached_data
+        data = RecipeSerializer(recipes, many=True).data
+        return {recipe.id: item for recipe, item in zip(recipes, data)}
+
+    def get_media_url(self, url):
+        return url and self.request.build_absolute_uri(url)
+
+    def merge_state(self, payload, state):
+        """Кэшированный ответ с флагами пользователя и абсолютными
+        ссылками текущего запроса."""
+        author = payload['author']
+        return {
+            **payload,
+            'image': self.get_media_url(payload['image']),
+            'author': {
+                **author,
+                'avatar': self.get_media_url(author['avatar']),
+                'is_subscribed': state['author_is_subscribed'],
+            },
+            'is_favorited': state['is_favorited'],
+            'is_in_shopping_cart': state['is_in_shopping_cart'],
+        }
+
+    def get_cached_data(self, states):
+        payloads = get_recipe_payloads(
+            {state['id']: state['updated_at'] for state in states},
+            self.build_payloads
+        )
+        return [
+            self.merge_state(payloads[state['id']], state)
+            for state in states if state['id'] in payloads
+        ]
+
+    def get_ordered_data(self, recipe_ids):
+        """Ответ для рецептов recipe_ids в заданном порядке."""
+        states = {
+            state['id']: state
+            for state in Recipe.objects.with_user_flags(
+                self.request.user
+            ).filter(id__in=recipe_ids).values(*self.state_fields)
+        }
+        return self.get_cached_data(
+            [states[pk] for pk in recipe_ids if pk in states]
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_state_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_cached_data(page))
+        return Response(self.get_cached_data(list(queryset)))
+
+    def retrieve(self, request, *args, **kwargs):
+        state = get_object_or_404(
+            self.get_state_queryset(), pk=self.get_recipe_id()
+        )
+        data = self.get_cached_data([state])
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь.
+        Страница читается из FeedItem диапазоном по индексу, рецепты
+        авторов с большим числом подписчиков добавляются при чтении."""
+        items = self.paginate_queryset(get_feed(request.user.pk))
+        data = self.get_ordered_data([item['recipe_id'] for item in items])
+        return self.get_paginated_response(data)
+
+    similar_limit = 6
+
+    @action(detail=True, methods=['get'], pagination_class=None)
+    def similar(self, request, pk=None):
+        """Рецепты с похожим набором ингредиентов из заранее
+        посчитанного списка (recipes.similar)."""
+        recipe_id = self.get_recipe_id()
+        limit = get_limit(
+            request, self.similar_limit, settings.SIMILAR_RECIPES_COUNT
+        )
+        similar_ids = get_similar_ids(recipe_id, limit)
+        if not similar_ids:
+            get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
+        return Response(self.get_ordered_data(similar_ids))
+
+    recommended_limit = 20
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            filter_backends=[], pagination_class=None)
+    def recommended(self, request):
+        """Рекомендации по избранному и корзинам похожих пользователей,
+        заранее посчитанные командой build_recommendations. Пока их
+        нет, отдаются самые популярные рецепты."""
+        limit = get_limit(
+            request, self.recommended_limit,
+            settings.RECOMMENDED_RECIPES_COUNT
+        )
+        recipe_ids = Recommendation.objects.filter(
+            user=request.user
+        ).values_list('recipe_ids', flat=True).first()
+        if recipe_ids is None:
+            recipe_ids = Recipe.objects.order_by(
+                '-favorites_count', 'id'
+            ).values_list('id', flat=True)
+        return Response(self.get_ordered_data(list(recipe_ids[:limit])))
+
+    pantry_limit = 20
+    pantry_max_limit = 50
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny],
+            filter_backends=[], pagination_class=None)
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из имеющихся продуктов:
+        по убыванию доли ингредиентов рецепта, которые уже есть.
+        Подбор идёт по индексу в памяти процесса (recipes.pantry)."""
+        serializer = PantrySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        matches = get_pantry_index().match(
+            params['ingredients'],
+            get_limit(request, self.pantry_limit, self.pantry_max_limit),
+            tags=params['tags'],
+            max_cooking_time=params.get('max_cooking_time'),
+        )
+        data = {
+            item['id']: item
+            for item in self.get_ordered_data(
+                [recipe_id for recipe_id, _, _ in matches]
+            )
+        }
+        return Response([
+            {
+                **data[recipe_id],
+                'matched_ingredients': matched,
+                'missing_ingredients': total - matched,
+            }
+            for recipe_id, matched, total in matches if recipe_id in data
+        ])
+
+    suggest_limit = 10
+    suggest_max_limit = 20
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny],
+            filter_backends=[], pagination_class=None)
+    def suggest(self, request):
+        """Подсказки по началу слов названия; отдаются из индекса
+        в памяти процесса без запросов к базе."""
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            return Response(
+                {'errors': 'Укажите начало названия в параметре name.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = get_limit(request, self.suggest_limit, self.suggest_max_limit)
+        return Response(get_recipe_name_index().suggest(name, limit))
+
+    def get_recipe_id(self):
+        # Рецепт целиком не загружается: достаточно его id
+        try:
+            return int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
-        recipe = self.get_object()
+        recipe_id = self.get_recipe_id()
         user = request.user
         if request.method == 'POST':
-            if Favorite.objects.filter(user=user, recipe=recipe).exists():
-                return Response(
-                    {'errors': 'Рецепт уже в избранном.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            Favorite.objects.create(user=user, recipe=recipe)
-            return Response(status=status.HTTP_201_CREATED)
+            if add_to_favorites(user, [recipe_id]):
+                return Response(status=status.HTTP_201_CREATED)
+            get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
+            return Response(
+                {'errors': 'Рецепт уже в избранном.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         else:
-            favorite = get_object_or_404(Favorite, user=user, recipe=recipe)
-            favorite.delete()
+            if not remove_from_favorites(user, [recipe_id]):
+                raise Http404
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk=None):
-        recipe = self.get_object()
+        recipe_id = self.get_recipe_id()
         user = request.user
         if request.method == 'POST':
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-                return Response(
-                    {'errors': 'Рецепт уже в корзине.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            ShoppingCart.objects.create(user=user, recipe=recipe)
-            return Response(status=status.HTTP_201_CREATED)
-        else:
-            cart_item = get_object_or_404(
-                ShoppingCart, user=user, recipe=recipe
+            if add_to_shopping_cart(user, [recipe_id]):
+                return Response(status=status.HTTP_201_CREATED)
+            get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
+            return Response(
+                {'errors': 'Рецепт уже в корзине.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            cart_item.delete()
+        else:
+            if not remove_from_shopping_cart(user, [recipe_id]):
+                raise Http404
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get'],
+    def bulk_relation_response(self, request, add, remove):
+        """Добавляет или убирает сразу несколько рецептов из списка
+        {"recipes": [id, ...]} в одной транзакции. Результат
+        возвращается для каждого id."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        user = request.user
+        with transaction.atomic():
+            if request.method == 'POST':
+                changed = add(user, recipe_ids)
+                found = set(Recipe.objects.filter(
+                    id__in=set(recipe_ids) - changed
+                ).values_list('id', flat=True))
+                done, skipped = 'added', 'exists'
+            else:
+                changed = remove(user, recipe_ids)
+                found = set()
+                done = 'removed'
+        results = [
+            {
+                'id': recipe_id,
+                'status': (
+                    done if recipe_id in changed
+                    else skipped if recipe_id in found
+                    else 'not_found'
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]
+        return Response({'results': results})
+
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
             permission_classes=[IsAuthenticated])
+    def favorite_many(self, request):
+        return self.bulk_relation_response(
+            request, add_to_favorites, remove_from_favorites
+        )
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_many(self, request):
+        return self.bulk_relation_response(
+            request, add_to_shopping_cart, remove_from_shopping_cart
+        )
+
+    @action(detail=False, methods=['delete'], url_path='shopping_cart/clear',
+            permission_classes=[IsAuthenticated])
+    def clear_shopping_cart(self, request):
+        remove_from_shopping_cart(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
+        # Формат (txt, csv, pdf) выбирается DRF по ?format= или Accept
+        renderer = request.accepted_renderer
         user = request.user
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in_shopping_cart__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(total=Sum('amount'))
-
-        shopping_list = []
-        for item in ingredients:
-            shopping_list.append(
-                f"{item['ingredient__name']} "
-                f"({item['ingredient__measurement_unit']}) — {item['total']}"
+        version = get_shopping_list_version(user.id)
+        etag = quote_etag(f'{version}-{renderer.format}')
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        key = f'recipes:shopping_list:{user.id}:{version}:{renderer.format}'
+        content = cache.get(key)
+        if content is not None:
+            chunks = [content]
+        else:
+            # Итоги поддерживаются при изменении корзины
+            # (recipes.shopping_list)
+            rows = ShoppingListItem.objects.filter(user=user).values_list(
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'amount'
+            ).order_by('ingredient__name')
+            chunks = cache_streamed(
+                key, renderer.generate(rows.iterator()),
+                settings.SHOPPING_LIST_CACHE_TIMEOUT
             )
 
-        response = HttpResponse(
-            '\n'.join(shopping_list),
-            content_type='text/plain'
+        response = StreamingHttpResponse(
+            chunks, content_type=renderer.content_type
         )
+        response['ETag'] = etag
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
         return response
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
     pagination_class = None
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
+
+    def list(self, request, *args, **kwargs):
+        # Поиск по префиксу обслуживается индексом в памяти процесса
+        name = request.query_params.get('name')
+        if name:
+            return self.catalog_response(
+                request, lambda: get_ingredient_index().startswith(name)
+            )
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            return Response(
+                {'errors': 'Укажите начало названия в параметре name.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = get_limit(
+            request, self.autocomplete_limit, self.autocomplete_max_limit
+        )
+        return self.catalog_response(
+            request, lambda: get_ingredient_index().autocomplete(name, limit)
+        )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
@@ -123,18 +445,25 @@ class RecipeDetailView(DetailView):
     template_name = 'recipes/detail.html'
     context_object_name = 'recipe'
     
+    def get_queryset(self):
+        return Recipe.objects.for_read(self.request.user)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        recipe = self.get_object()
-        
-        # Добавляем дополнительные данные
-        context['is_subscribed'] = False
-        if self.request.user.is_authenticated:
-            # Проверяем подписку
-            context['is_subscribed'] = self.request.user.subscriptions.filter(
-                author=recipe.author
-            ).exists()
-        
+        # Подписка на автора уже посчитана в queryset
+        context['is_subscribed'] = self.object.author_is_subscribed
+        similar_ids = get_similar_ids(
+            self.object.pk, RecipeViewSet.similar_limit
+        )
+        # Карточки похожих рецептов показывают флаги пользователя
+        recipes = Recipe.objects.with_user_flags(
+            self.request.user
+        ).select_related('author').prefetch_related('tags').in_bulk(
+            similar_ids
+        )
+        context['similar_recipes'] = [
+            recipes[pk] for pk in similar_ids if pk in recipes
+        ]
         return context
 
 
@@ -152,8 +481,7 @@ def get(self, request, pk=None):
             form = RecipeForm()
             is_edit = False
         
-        # Получаем все ингредиенты для выпадающего списка
-        ingredients = Ingredient.objects.all().order_by('name')
+        # Ингредиенты подгружаются формой через /api/ingredients/autocomplete/
         tags = Tag.objects.all()
         
         # Получаем ингредиенты рецепта для редактирования
@@ -163,7 +491,6 @@ def get(self, request, pk=None):
         
         context = {
             'form': form,
-            'ingredients': ingredients,
             'tags': tags,
             'recipe_ingredients': recipe_ingredients,
             'is_edit': is_edit,
@@ -191,59 +518,21 @@ def post(self, request, pk=None):
             if not is_edit:
                 recipe.author = request.user
             
-            recipe.save()
-            
-            # Сохраняем теги
-            tags_ids = request.POST.getlist('tags')
-            recipe.tags.set(Tag.objects.filter(id__in=tags_ids))
-            
-            # Обрабатываем ингредиенты из JSON
-            ingredients_data = request.POST.get('ingredients_data')
-            
-            if ingredients_data:
-                try:
-                    ingredients_list = json.loads(ingredients_data)
-                    
-                    # Удаляем старые связи (при редактировании)
-                    RecipeIngredient.objects.filter(recipe=recipe).delete()
-                    
-                    # Создаем новые связи
-                    for item in ingredients_list:
-                        try:
-                            ingredient_id = item.get('id')
-                            amount = item.get('amount')
-                            
-                            if ingredient_id and amount:
-                                ingredient = Ingredient.objects.get(id=ingredient_id)
-                                RecipeIngredient.objects.create(
-                                    recipe=recipe,
-                                    ingredient=ingredient,
-                                    amount=amount
-                                )
-                        except Ingredient.DoesNotExist:
-                            continue
-                        except Exception as e:
-                            print(f"Ошибка при создании связи: {e}")
-                            continue
-                            
-                except json.JSONDecodeError:
-                    pass
-                except Exception as e:
-                    print(f"Общая ошибка при обработке ингредиентов: {e}")
-            
-            # Сохраняем ManyToMany поля
-            form.save_m2m()
+            # Рецепт, теги и ингредиенты сохраняются одной транзакцией
+            save_recipe(
+                recipe,
+                form.cleaned_data['tags'],
+                form.cleaned_data['ingredients_data']
+            )
             
             # Перенаправляем на страницу рецепта
             return redirect('detail_recipe', pk=recipe.pk)
         
         # Если форма не валидна
-        ingredients = Ingredient.objects.all().order_by('name')
         tags = Tag.objects.all()
         
         context = {
             'form': form,
-            'ingredients': ingredients,
             'tags': tags,
             'is_edit': is_edit,
             'recipe': recipe,
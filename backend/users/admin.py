@@ -5,6 +5,9 @@
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
-    list_display = ('email', 'username', 'first_name', 'last_name', 'is_staff')
+    list_display = (
+        'email', 'username', 'first_name', 'last_name', 'is_staff',
+        'recipes_count', 'subscribers_count'
+    )
     search_fields = ('email', 'username')
     ordering = ('email',)
\ No newline at end of file
@@ -1,11 +1,40 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
-class User(AbstractUser):
+
+class CounterFieldsMixin:
+    """Модель с денормализованными счётчиками counter_fields, которые
+    меняются только через F() (recipes.counters). save() существующего
+    объекта их не записывает, чтобы устаревший экземпляр не затирал
+    значения, изменённые параллельно."""
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(unique=True, blank=False)
     first_name = models.CharField(max_length=150, blank=False)
     last_name = models.CharField(max_length=150, blank=False)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    # Счётчики меняет recipes.counters через F(); пересчитываются
+    # командой reconcile_counters
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+
+    counter_fields = ('subscribers_count', 'recipes_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -16,4 +45,4 @@ class Meta:
         verbose_name_plural = 'Пользователи'
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
@@ -1,6 +1,12 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import BooleanField, Value
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import get_user_model
@@ -11,8 +17,10 @@
 from django.urls import reverse_lazy
 from django.contrib.auth.models import User
 from djoser.views import UserViewSet as DjoserUserViewSet
-from recipes.models import Subscription, Recipe
-from recipes.serializers import RecipeSerializer
+from recipes.models import Recipe
+from recipes.serializers import RecipeSerializer, SubscriptionSerializer
+from recipes.services import follow_author, unfollow_author
+from api.pagination import SubscriptionPagination
 from .serializers import UserSerializer
 
 User = get_user_model()
@@ -37,34 +45,65 @@ class UserViewSet(DjoserUserViewSet):
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, id=None):
-        author = get_object_or_404(User, id=id)
+        try:
+            author_id = int(id)
+        except ValueError:
+            raise Http404
         user = request.user
         if request.method == 'POST':
-            if author == user:
+            if author_id == user.pk:
                 return Response(
                     {'errors': 'Нельзя подписаться на себя.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            if Subscription.objects.filter(user=user, author=author).exists():
+            created = follow_author(user, author_id)
+            author = get_object_or_404(User, id=author_id)
+            if not created:
                 return Response(
                     {'errors': 'Вы уже подписаны.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Subscription.objects.create(user=user, author=author)
             serializer = self.get_serializer(author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
-            subscription = get_object_or_404(
-                Subscription, user=user, author=author
-            )
-            subscription.delete()
+            if not unfollow_author(user, author_id):
+                raise Http404
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            pagination_class=SubscriptionPagination)
     def subscriptions(self, request):
         user = request.user
-        authors = User.objects.filter(subscribers__user=user)
+        # recipes_count — денормализованный счётчик автора
+        authors = User.objects.filter(subscribers__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
         page = self.paginate_queryset(authors)
-        serializer = self.get_serializer(page, many=True)
-        return self.get_paginated_response(serializer.data)
\ No newline at end of file
+        # Последние рецепты всех авторов страницы одним запросом
+        latest = defaultdict(list)
+        recipes = Recipe.objects.latest_by_author(
+            [author.id for author in page], self.get_recipes_limit()
+        )
+        for recipe in recipes:
+            latest[recipe.author_id].append(recipe)
+        for author in page:
+            author.latest_recipes = latest[author.id]
+        serializer = SubscriptionSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def get_recipes_limit(self):
+        limit = self.request.query_params.get('recipes_limit')
+        if limit is None:
+            return settings.SUBSCRIPTION_RECIPES_LIMIT
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError(
+                {'recipes_limit': 'Укажите целое число больше нуля.'}
+            )
+        return min(limit, settings.SUBSCRIPTION_RECIPES_MAX_LIMIT)
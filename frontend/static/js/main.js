@@ -410,7 +410,7 @@ const Foodgram = {
         }
 
         try {
-            await this.apiRequest('/shopping_cart/clear/', {
+            await this.apiRequest('/recipes/shopping_cart/clear/', {
                 method: 'DELETE'
             });
             this.showNotification('Список покупок очищен', 'success');
@@ -27,45 +27,43 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Функции
     function loadIngredients() {
+        const search = document.getElementById('ingredient-search');
         const select = document.getElementById('ingredient-select');
-        if (!select) return;
+        if (!search || !select) return;
+        
+        // Ингредиенты ищутся по мере ввода, а не загружаются целиком
+        let timer = null;
+        let lastQuery = '';
+        search.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(() => searchIngredients(this.value.trim()), 250);
+        });
         
-        // Пробуем загрузить ингредиенты
-        fetch('/api/ingredients/')
-            .then(response => {
-                if (!response.ok) {
-                    // Пробуем альтернативный URL
-                    return fetch('/ingredients/');
-                }
-                return response;
-            })
-            .then(response => response.json())
-            .then(data => {
-                const ingredientsList = data.results || data;
-                if (Array.isArray(ingredientsList) && ingredientsList.length > 0) {
-                    populateIngredientsSelect(ingredientsList);
-                } else {
-                    console.warn('Список ингредиентов пуст');
-                    const option = document.createElement('option');
-                    option.value = '';
-                    option.textContent = 'Ингредиенты не найдены';
-                    select.appendChild(option);
-                }
-            })
-            .catch(error => {
-                console.error('Ошибка загрузки ингредиентов:', error);
-                // Показываем сообщение в интерфейсе
-                const container = document.getElementById('selected-ingredients');
-                if (container) {
-                    const errorDiv = document.createElement('div');
-                    errorDiv.className = 'alert alert-error';
-                    errorDiv.innerHTML = `
-                        <p><strong>Ошибка загрузки ингредиентов:</strong></p>
-                        <p>Пожалуйста, обновите страницу.</p>
-                    `;
-                    container.parentNode.insertBefore(errorDiv, container);
-                }
-            });
+        function searchIngredients(query) {
+            if (query === lastQuery) return;
+            lastQuery = query;
+            if (!query) {
+                populateIngredientsSelect([]);
+                return;
+            }
+            
+            const params = new URLSearchParams({name: query, limit: 20});
+            fetch(`/api/ingredients/autocomplete/?${params}`)
+                .then(response => response.json())
+                .then(data => {
+                    // Ответ на устаревший запрос игнорируем
+                    if (query !== lastQuery) return;
+                    if (Array.isArray(data) && data.length > 0) {
+                        populateIngredientsSelect(data);
+                    } else {
+                        populateIngredientsSelect([]);
+                        select.options[0].textContent = 'Ингредиенты не найдены';
+                    }
+                })
+                .catch(error => {
+                    console.error('Ошибка поиска ингредиентов:', error);
+                });
+        }
     }
     
     function populateIngredientsSelect(ingredientsList) {
@@ -80,10 +78,12 @@ document.addEventListener('DOMContentLoaded', function() {
         // Добавляем опцию по умолчанию
         const defaultOption = document.createElement('option');
         defaultOption.value = '';
-        defaultOption.textContent = 'Выберите ингредиент...';
+        defaultOption.textContent = ingredientsList.length > 0
+            ? 'Выберите ингредиент...'
+            : 'Введите название ингредиента...';
         select.appendChild(defaultOption);
         
-        // Добавляем все ингредиенты
+        // Добавляем найденные ингредиенты
         ingredientsList.forEach(ingredient => {
             const option = document.createElement('option');
             option.value = ingredient.id;
@@ -92,7 +92,7 @@ document.addEventListener('DOMContentLoaded', function() {
             select.appendChild(option);
         });
         
-        console.log(`Загружено ${ingredientsList.length} ингредиентов`);
+        console.log(`Найдено ${ingredientsList.length} ингредиентов`);
     }
     
     function setupImagePreview() {